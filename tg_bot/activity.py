@@ -0,0 +1,79 @@
+﻿import asyncio
+import logging
+from datetime import datetime, timezone
+
+from database import update_users_activity_batch, merge_activity_sketches
+from sketch import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 🕓 ПАКЕТНИЙ ЗАПИС АКТИВНОСТІ
+# ==========================================
+
+class ActivityTracker:
+    """
+    Накопичує "останню активність" у пам'яті і скидає її в базу
+    однією транзакцією раз на interval секунд. Хендлери на цей запис не чекають.
+    Пишеться лише last_active; рядок нового юзера створює ActivityMiddleware одразу.
+    Паралельно рахує унікальних активних за день у HyperLogLog-скетчах (DAU/MAU).
+    """
+
+    def __init__(self, interval: float = 30):
+        self.interval = interval
+        self._pending = {}  # user_id -> last_active
+        self._sketches = {}  # 'YYYY-MM-DD' -> HyperLogLog за поточний інтервал
+        self.flushed_rows = 0
+
+    def touch(self, user_id: int):
+        # Формат як у CURRENT_TIMESTAMP (UTC), щоб SQL-запити по last_active не змінились
+        self._pending[user_id] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    def mark_active(self, user_id: int):
+        """Кожна подія юзера; дублікати скетч поглинає сам."""
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        sketch = self._sketches.get(day)
+        if sketch is None:
+            sketch = self._sketches[day] = HyperLogLog()
+        sketch.add(user_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self):
+        await self._flush_sketches()
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        rows = list(batch.items())
+        try:
+            written = await asyncio.to_thread(update_users_activity_batch, rows)
+        except Exception as e:
+            logger.error(f"❌ Activity flush failed ({len(rows)} rows): {e}")
+            # Повертаємо пачку назад, новіші дані (якщо вже є) мають пріоритет
+            for uid, values in batch.items():
+                self._pending.setdefault(uid, values)
+            return 0
+        self.flushed_rows += written
+        return written
+
+    async def _flush_sketches(self):
+        if not self._sketches:
+            return
+        sketches, self._sketches = self._sketches, {}
+        try:
+            await asyncio.to_thread(merge_activity_sketches, sketches)
+        except Exception as e:
+            logger.error(f"❌ Activity sketch flush failed: {e}")
+            for day, sketch in sketches.items():
+                if day in self._sketches: self._sketches[day].merge(sketch)
+                else: self._sketches[day] = sketch
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+activity_tracker = ActivityTracker()
@@ -0,0 +1,323 @@
+﻿import argparse
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from config import DB_FILE, BACKUP_DIR, BACKUP_KEEP_DAYS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstd — необов'язкова залежність
+    zstandard = None
+
+# ==========================================
+# 💾 КОНСИСТЕНТНИЙ ЕКСПОРТ БАЗИ
+# ==========================================
+# Копіюємо через online backup API: сторінки читаються порціями, між ними
+# з'єднання відпускає блокування, тож бот пише далі. У WAL-режимі копія
+# включає і вміст -wal файлу, чого не дає просте копіювання bot_database.db.
+
+TELEGRAM_PART_SIZE = 49 * 1024 * 1024   # ліміт документа Telegram — 50 MB
+BACKUP_STEP_PAGES = 1024                # 4 MB за крок при page_size = 4096
+COPY_BUFFER = 1024 * 1024
+
+
+def snapshot_db(dest_path: str, src_path: str = DB_FILE, step_pages: int = BACKUP_STEP_PAGES) -> dict:
+    started = time.perf_counter()
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    src = sqlite3.connect(src_path, timeout=30.0)
+    dst = sqlite3.connect(dest_path)
+    try:
+        src.backup(dst, pages=step_pages, progress=progress)
+        dst.execute("PRAGMA journal_mode = DELETE")  # одним файлом, без -wal поруч
+    finally:
+        dst.close()
+        src.close()
+    return {"path": dest_path, "bytes": os.path.getsize(dest_path), "steps": steps,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def compress_file(path: str, method: str = "gzip") -> str:
+    if method == "zstd" and zstandard is None:
+        method = "gzip"
+    if method == "zstd":
+        out_path = path + ".zst"
+        with open(path, "rb") as src, open(out_path, "wb") as dst:
+            zstandard.ZstdCompressor(level=10, threads=-1).copy_stream(src, dst)
+    else:
+        out_path = path + ".gz"
+        with open(path, "rb") as src, gzip.open(out_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+    os.remove(path)
+    return out_path
+
+
+def split_file(path: str, part_size: int = TELEGRAM_PART_SIZE) -> list:
+    """Ріже файл на шматки .part01, .part02... Якщо влазить в один — повертає як є."""
+    if os.path.getsize(path) <= part_size:
+        return [path]
+    parts = []
+    with open(path, "rb") as src:
+        index = 1
+        while True:
+            part_path = f"{path}.part{index:02d}"
+            written = 0
+            with open(part_path, "wb") as dst:
+                while written < part_size:
+                    chunk = src.read(min(COPY_BUFFER, part_size - written))
+                    if not chunk: break
+                    dst.write(chunk)
+                    written += len(chunk)
+            if not written:
+                os.remove(part_path)
+                break
+            parts.append(part_path)
+            index += 1
+    os.remove(path)
+    return parts
+
+
+def export_database(compress: str = "gzip", workdir: str = None) -> tuple:
+    """
+    Знімок -> стиснення -> нарізка. Повертає (тимчасова папка, [файли], інфо).
+    Папку після відправки прибирає викликач (shutil.rmtree).
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="db_export_")
+    name = f"backup_{datetime.now():%Y%m%d_%H%M%S}.db"
+    info = snapshot_db(os.path.join(workdir, name))
+    path = info["path"]
+    if compress:
+        path = compress_file(path, compress)
+    return workdir, split_file(path), info
+
+
+# ==========================================
+# 🗄 ПЛАНОВІ БЕКАПИ (ПОВНИЙ + ІНКРЕМЕНТИ)
+# ==========================================
+# BACKUP_DIR/<full_ts>/            — ланцюжок від одного повного бекапу
+#     base.db.gz                  — повний знімок (backup API)
+#     inc_<ts>.pages.gz           — сторінки, що змінились з попереднього знімка
+#     head.hashes                 — blake2b кожної сторінки останнього стану (16 байт/сторінку),
+#                                   з ними порівнюється наступний знімок; для restore не потрібні
+#
+# Формат інкремента: MAGIC, page_size, page_count, далі записи (page_no, сторінка).
+# Відновлення на момент T = base + всі інкременти з ts <= T.
+# Знімок для інкремента тимчасовий: перевірка цілісності -> дифф -> видалення,
+# тож між бекапами на диску лежать лише стиснені файли і хеші.
+
+INC_MAGIC = b"TGINC1"
+TS_FORMAT = "%Y%m%d_%H%M%S"
+DIGEST_SIZE = 16
+_backup_lock = threading.Lock()   # повний та інкрементальний не мають перетинатись
+
+
+def _page_size(path: str) -> int:
+    with open(path, "rb") as f:
+        f.seek(16)
+        size = struct.unpack(">H", f.read(2))[0]
+    return 65536 if size == 1 else size
+
+
+def _integrity_check(path: str) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _chains(backup_dir: str = BACKUP_DIR) -> list:
+    if not os.path.isdir(backup_dir): return []
+    return sorted(d for d in os.listdir(backup_dir) if os.path.isfile(os.path.join(backup_dir, d, "base.db.gz")))
+
+
+def _page_digest(page: bytes) -> bytes:
+    return hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+
+
+def _write_digests(chain: str, digests: bytes):
+    tmp = os.path.join(chain, "head.hashes.tmp")
+    with open(tmp, "wb") as f:
+        f.write(digests)
+    os.replace(tmp, os.path.join(chain, "head.hashes"))
+
+
+def _checked_snapshot(path: str) -> dict:
+    """Знімок + integrity_check на копії; битий знімок видаляється і не потрапляє в бекап."""
+    info = snapshot_db(path)
+    info["integrity"] = _integrity_check(path)
+    if info["integrity"] != "ok":
+        os.remove(path)
+        raise RuntimeError(f"Backup integrity_check failed: {info['integrity']}")
+    return info
+
+
+def run_full_backup(backup_dir: str = BACKUP_DIR) -> dict:
+    """Новий ланцюжок: знімок, перевірка цілісності (на копії, не на живій базі), стиснення."""
+    with _backup_lock:
+        ts = datetime.now().strftime(TS_FORMAT)
+        chain = os.path.join(backup_dir, ts)
+        os.makedirs(chain, exist_ok=True)
+        snapshot = os.path.join(chain, "base.db")
+        try:
+            info = _checked_snapshot(snapshot)
+        except RuntimeError:
+            shutil.rmtree(chain, ignore_errors=True)
+            raise
+        page_size = _page_size(snapshot)
+        digests = bytearray()
+        with open(snapshot, "rb") as src, gzip.open(os.path.join(chain, "base.db.gz"), "wb", compresslevel=6) as dst:
+            while page := src.read(page_size):
+                dst.write(page)
+                digests += _page_digest(page)
+        _write_digests(chain, digests)
+        os.remove(snapshot)
+        # Ланцюжки до цього більше не продовжуються — їхні робочі копії не потрібні
+        # (head.db лишився в ланцюжках зі старих версій)
+        for name in _chains(backup_dir):
+            if name == ts: continue
+            for leftover in ("head.db", "head.hashes"):
+                with suppress(FileNotFoundError):
+                    os.remove(os.path.join(backup_dir, name, leftover))
+        info.update({"path": os.path.join(chain, "base.db.gz"), "chain": ts})
+        info["pruned"] = prune_backups(backup_dir)
+        return info
+
+
+def run_incremental_backup(backup_dir: str = BACKUP_DIR) -> dict:
+    """Знімок, перевірка цілісності і запис лише сторінок, чий хеш змінився з минулого разу."""
+    chains = _chains(backup_dir)
+    if not chains or not os.path.isfile(os.path.join(backup_dir, chains[-1], "head.hashes")):
+        return run_full_backup(backup_dir)
+
+    with _backup_lock:
+        chain = os.path.join(backup_dir, chains[-1])
+        ts = datetime.now().strftime(TS_FORMAT)
+        fresh = os.path.join(chain, f"snapshot_{ts}.db")
+        info = _checked_snapshot(fresh)
+        try:
+            with open(os.path.join(chain, "head.hashes"), "rb") as f:
+                old_digests = f.read()
+            page_size = _page_size(fresh)
+            page_count = os.path.getsize(fresh) // page_size
+            digests = bytearray()
+            changed = 0
+            inc_path = os.path.join(chain, f"inc_{ts}.pages.gz")
+            with open(fresh, "rb") as new, gzip.open(inc_path, "wb", compresslevel=6) as out:
+                out.write(INC_MAGIC + struct.pack(">II", page_size, page_count))
+                for page_no in range(page_count):
+                    page = new.read(page_size)
+                    digest = _page_digest(page)
+                    digests += digest
+                    if old_digests[page_no * DIGEST_SIZE:(page_no + 1) * DIGEST_SIZE] != digest:
+                        out.write(struct.pack(">I", page_no) + page)
+                        changed += 1
+            if changed == 0 and len(old_digests) == len(digests):
+                os.remove(inc_path)   # нічого не змінилось — інкремент не потрібен
+                inc_path = None
+            _write_digests(chain, digests)
+        finally:
+            os.remove(fresh)
+
+        info.update({"path": inc_path, "chain": chains[-1], "changed_pages": changed, "page_count": page_count})
+        return info
+
+
+def prune_backups(backup_dir: str = BACKUP_DIR, keep_days: int = BACKUP_KEEP_DAYS) -> list:
+    """Видаляє ланцюжки старші за keep_days, але завжди лишає останній."""
+    cutoff = datetime.now() - timedelta(days=keep_days)
+    removed = []
+    for name in _chains(backup_dir)[:-1]:
+        if datetime.strptime(name, TS_FORMAT) < cutoff:
+            shutil.rmtree(os.path.join(backup_dir, name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def _apply_increment(db_path: str, inc_path: str):
+    with gzip.open(inc_path, "rb") as inc, open(db_path, "r+b") as db:
+        header = inc.read(len(INC_MAGIC) + 8)
+        if not header.startswith(INC_MAGIC):
+            raise ValueError(f"{inc_path}: не інкремент бекапу")
+        page_size, page_count = struct.unpack(">II", header[len(INC_MAGIC):])
+        while True:
+            raw_no = inc.read(4)
+            if not raw_no: break
+            page_no = struct.unpack(">I", raw_no)[0]
+            db.seek(page_no * page_size)
+            db.write(inc.read(page_size))
+        db.truncate(page_count * page_size)
+
+
+def restore(target: str, at: datetime = None, backup_dir: str = BACKUP_DIR) -> dict:
+    """Point-in-time restore: найновіший ланцюжок, що почався до at, + його інкременти до at."""
+    at = at or datetime.now()
+    chains = [c for c in _chains(backup_dir) if datetime.strptime(c, TS_FORMAT) <= at]
+    if not chains:
+        raise FileNotFoundError(f"Немає повного бекапу до {at:%Y-%m-%d %H:%M:%S}")
+    chain = os.path.join(backup_dir, chains[-1])
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} вже існує — не перезаписую")
+
+    with gzip.open(os.path.join(chain, "base.db.gz"), "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER)
+
+    applied = []
+    for name in sorted(f for f in os.listdir(chain) if f.startswith("inc_")):
+        if datetime.strptime(name[4:4 + 15], TS_FORMAT) > at: break
+        _apply_increment(target, os.path.join(chain, name))
+        applied.append(name)
+
+    return {"chain": chains[-1], "increments": applied, "integrity": _integrity_check(target)}
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Бекапи бази: full / incremental / list / restore")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("full", help="новий повний бекап")
+    sub.add_parser("incremental", help="інкремент до останнього повного")
+    sub.add_parser("list", help="показати ланцюжки")
+    r = sub.add_parser("restore", help="відновити в новий файл")
+    r.add_argument("target", help="куди записати відновлену базу")
+    r.add_argument("--at", help="момент часу 'YYYY-MM-DD HH:MM[:SS]' (за замовчуванням — останній стан)")
+    p.add_argument("--dir", default=BACKUP_DIR)
+    args = p.parse_args(argv)
+
+    if args.cmd == "full":
+        print(run_full_backup(args.dir))
+    elif args.cmd == "incremental":
+        print(run_incremental_backup(args.dir))
+    elif args.cmd == "list":
+        for name in _chains(args.dir):
+            incs = sorted(f for f in os.listdir(os.path.join(args.dir, name)) if f.startswith("inc_"))
+            print(f"{name}: {len(incs)} інкрементів" + (f", останній {incs[-1][4:19]}" if incs else ""))
+    elif args.cmd == "restore":
+        at = None
+        if args.at:
+            fmt = "%Y-%m-%d %H:%M:%S" if args.at.count(":") == 2 else "%Y-%m-%d %H:%M"
+            at = datetime.strptime(args.at, fmt)
+        result = restore(args.target, at, args.dir)
+        print(result)
+        return 0 if result["integrity"] == "ok" else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
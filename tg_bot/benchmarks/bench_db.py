@@ -0,0 +1,237 @@
+﻿"""
+Мікробенчмарки гарячих функцій database.py.
+
+Запуск (з папки tg_bot):
+    python -m benchmarks.bench_db                 # повний обсяг (100k юзерів, 1M пошуків...)
+    python -m benchmarks.bench_db --scale 0.05    # швидкий прогін
+
+Результати пишуться в benchmarks/results/<дата>_<commit>.json і порівнюються
+з попереднім файлом, щоб регресії було видно між комітами.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# База має бути тимчасовою ще ДО імпорту config/database
+_TMP_DIR = tempfile.mkdtemp(prefix="bench_db_")
+os.environ["DB_PATH"] = os.path.join(_TMP_DIR, "bench.db")
+
+import database
+from benchmarks import datagen
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+REGRESSION_THRESHOLD = 1.2  # +20% до медіани вважаємо регресією
+
+# ==========================================
+# 🌱 НАПОВНЕННЯ БАЗИ
+# ==========================================
+
+def seed(scale: float, seed_value: int) -> dict:
+    database.init_db()
+    conn = sqlite3.connect(database.DB_FILE)
+    counts = datagen.generate(conn, scale=scale, seed=seed_value)
+    conn.close()
+    return counts
+
+# ==========================================
+# ⏱ ВИМІРЮВАННЯ
+# ==========================================
+
+def measure(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return {
+        "runs": repeat,
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "max_ms": round(max(times) * 1000, 3),
+    }
+
+
+def bench_add_booking_contention(trip_ids, threads: int, per_thread: int) -> dict:
+    """Кілька потоків одночасно бронюють ті самі поїздки (BEGIN IMMEDIATE)."""
+    latencies, outcomes = [], {"ok": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        for i in range(per_thread):
+            passenger = 10_000_000 + worker_id * per_thread + i
+            started = time.perf_counter()
+            ok, _ = database.add_booking(trip_ids[i % len(trip_ids)], passenger)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                outcomes["ok" if ok else "rejected"] += 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(w,)) for w in range(threads)]
+    for t in pool: t.start()
+    for t in pool: t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "runs": len(latencies),
+        "threads": threads,
+        "median_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "ops_per_s": round(len(latencies) / wall, 1),
+        **outcomes,
+    }
+
+
+def bench_user_hot_path(user_ids, updates: int) -> dict:
+    """
+    Що робить типовий апдейт: перевірка бану, згоди з умовами і сам профіль.
+    Активні юзери повторюються (як у реальному потоці апдейтів), тож
+    db_reads/calls показує, яку частку звернень ще обслуговує SQLite.
+    """
+    rng = random.Random(1)
+    stream = [rng.choice(user_ids) for _ in range(updates)]
+    database.user_cache.clear()
+    before = database.user_cache.stats()
+    started = time.perf_counter()
+    for uid in stream:
+        database.is_user_banned(uid)
+        database.check_terms_status(uid)
+        database.get_user(uid)
+    elapsed = time.perf_counter() - started
+    db_reads = database.user_cache.stats()["db_reads"] - before["db_reads"]
+    return {"runs": updates, "median_ms": round(elapsed / updates * 1000, 4),
+            "calls": updates * 3, "db_reads": db_reads}
+
+
+def run_benchmarks(repeat: int) -> dict:
+    today = datetime.now().strftime("%d.%m")
+    conn = database.get_connection()
+    heavy_user = conn.execute(
+        "SELECT passenger_id FROM bookings GROUP BY passenger_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+    chat_pair = conn.execute(
+        "SELECT sender_id, receiver_id FROM chat_history GROUP BY sender_id, receiver_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+    active_trips = [r[0] for r in conn.execute(
+        "SELECT id FROM trips WHERE status='active' AND origin='Львів' AND destination='Київ' LIMIT 20"
+    )]
+    hot_users = [r[0] for r in conn.execute("SELECT user_id FROM users LIMIT 500")]
+    conn.close()
+
+    results = {}
+    # Холодний шлях (як до кешу маршрутів — порівнюється зі старими звітами) і з кешу
+    def search_cold(offset):
+        database.search_cache.clear()
+        return database.search_trips_page("Львів", "Київ", today, 1, 3, offset)
+    results["search_trips_page"] = measure(lambda: search_cold(0), repeat)
+    results["search_trips_page_offset"] = measure(lambda: search_cold(30), repeat)
+    results["search_trips_page_cached"] = measure(
+        lambda: database.search_trips_page("Львів", "Київ", today, 1, 3, 0), repeat)
+    def get_user_cold():
+        database.user_cache.invalidate(heavy_user)
+        return database.get_user(heavy_user)
+    results["get_user"] = measure(get_user_cold, repeat)
+    results["get_user_cached"] = measure(lambda: database.get_user(heavy_user), repeat)
+    results["save_user_update"] = measure(
+        lambda: database.save_user(heavy_user, "Бенч", "@bench", phone="+380670000000", color="Сірий"), repeat)
+    results["user_hot_path"] = bench_user_hot_path(hot_users, repeat * 100)
+    routes = [("Львів", city) for city in ("Київ", "Стрий", "Самбір", "Дрогобич", "Броди", "Жовква")]
+    results["save_search_history"] = measure(
+        lambda: database.save_search_history(heavy_user, *routes[time.perf_counter_ns() % len(routes)]), repeat)
+    results["get_recent_searches"] = measure(lambda: database.get_recent_searches(heavy_user), repeat)
+    results["get_user_bookings"] = measure(lambda: database.get_user_bookings(heavy_user), repeat)
+    results["get_chat_history_text"] = measure(lambda: database.get_chat_history_text(*chat_pair), repeat)
+    results["get_stats_extended"] = measure(database.get_stats_extended, max(3, repeat // 10))
+    results["add_booking_contention"] = bench_add_booking_contention(active_trips, threads=8, per_thread=max(5, repeat // 4))
+    # Очистка руйнує дані, тому йде останньою і один раз. Паузи між пачками — простій,
+    # тож без них час порівнюваний зі старими звітами; окремо — найдовше блокування запису.
+    database.CLEANUP_PAUSE = 0
+    started = time.perf_counter()
+    report = database.perform_db_cleanup()
+    results["perform_db_cleanup"] = {"runs": 1, "median_ms": round((time.perf_counter() - started) * 1000, 3),
+                                     "max_lock_ms": report["max_lock_ms"], "batches": report["batches"]}
+    return results
+
+# ==========================================
+# 💾 ЗБЕРЕЖЕННЯ ТА ПОРІВНЯННЯ
+# ==========================================
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "nogit"
+
+
+def _previous_report(exclude: str):
+    if not os.path.isdir(RESULTS_DIR): return None
+    files = sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith(".json") and f != exclude)
+    if not files: return None
+    with open(os.path.join(RESULTS_DIR, files[-1]), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current: dict, previous: dict) -> list:
+    lines, regressions = [], []
+    for name, res in current["results"].items():
+        old = previous["results"].get(name) if previous else None
+        reads = f"  [читань з БД {res['db_reads']:,} з {res['calls']:,}]" if "db_reads" in res else ""
+        if "max_lock_ms" in res:
+            reads = f"  [{res['batches']} транзакцій, найдовше блокування {res['max_lock_ms']} мс]"
+        if not old or not old.get("median_ms"):
+            lines.append(f"{name:<28} {res['median_ms']:>10.3f} ms{reads}")
+            continue
+        ratio = res["median_ms"] / old["median_ms"]
+        flag = "  ⚠️ РЕГРЕСІЯ" if ratio > REGRESSION_THRESHOLD else ""
+        if flag: regressions.append(name)
+        lines.append(f"{name:<28} {res['median_ms']:>10.3f} ms  (було {old['median_ms']:.3f}, x{ratio:.2f}){flag}{reads}")
+    print("\n".join(lines))
+    return regressions
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Мікробенчмарки database.py")
+    p.add_argument("--scale", type=float, default=1.0, help="множник обсягів даних (1.0 = 100k юзерів)")
+    p.add_argument("--repeat", type=int, default=50)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--no-save", action="store_true", help="не записувати JSON у benchmarks/results")
+    args = p.parse_args(argv)
+
+    started = time.perf_counter()
+    volumes = seed(args.scale, args.seed)
+    print(f"🌱 Дані згенеровано за {time.perf_counter() - started:.1f} с: {volumes}")
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "volumes": volumes,
+        "results": run_benchmarks(args.repeat),
+    }
+
+    filename = f"{datetime.now():%Y%m%d-%H%M%S}_{report['commit']}.json"
+    regressions = compare(report, _previous_report(filename))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, filename), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 {os.path.join(RESULTS_DIR, filename)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+﻿"""
+Бенчмарк кешів middlewares: звичайний dict проти caches.ExpiringMap.
+
+Симулює потік подій від великої кількості різних користувачів
+(за замовчуванням 1M) з віртуальним годинником і показує швидкість,
+розмір та пам'ять кожної структури після прогону.
+
+    python -m benchmarks.bench_expiring --users 1000000 --rate 2000
+"""
+import argparse
+import random
+import sys
+import time
+
+from caches import ExpiringMap
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _dict_bytes(d: dict) -> int:
+    if not d:
+        return sys.getsizeof(d)
+    key, value = next(iter(d.items()))
+    return sys.getsizeof(d) + len(d) * (sys.getsizeof(key) + sys.getsizeof(value))
+
+
+def run(users: int, rate: float, ttl: float, max_size: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    # Кожен користувач приходить 1-3 рази, події йдуть зі швидкістю rate/с
+    events = [uid for uid in range(users) for _ in range(rng.randint(1, 3))]
+    rng.shuffle(events)
+    step = 1.0 / rate
+
+    clock = _Clock()
+    plain = {}
+    bounded = ExpiringMap(ttl=ttl, max_size=max_size, clock=clock)
+
+    started = time.perf_counter()
+    for uid in events:
+        clock.now += step
+        if clock.now - plain.get(uid, 0) > ttl:
+            plain[uid] = clock.now
+    plain_s = time.perf_counter() - started
+
+    clock.now = 0.0
+    started = time.perf_counter()
+    for uid in events:
+        clock.now += step
+        if clock.now - bounded.get(uid, 0) > ttl:
+            bounded[uid] = clock.now
+    bounded_s = time.perf_counter() - started
+
+    return {
+        "events": len(events),
+        "dict": {"seconds": round(plain_s, 3), "size": len(plain), "memory_mb": round(_dict_bytes(plain) / 2**20, 1)},
+        "expiring": {"seconds": round(bounded_s, 3), **bounded.stats(),
+                     "memory_mb": round(bounded.memory_bytes() / 2**20, 1)},
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="dict vs ExpiringMap на потоці подій")
+    p.add_argument("--users", type=int, default=1_000_000)
+    p.add_argument("--rate", type=float, default=2000, help="подій на секунду віртуального часу")
+    p.add_argument("--ttl", type=float, default=300)
+    p.add_argument("--max-size", type=int, default=200_000)
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args(argv)
+
+    res = run(args.users, args.rate, args.ttl, args.max_size, args.seed)
+    print(f"📨 Подій: {res['events']:,} від {args.users:,} користувачів")
+    for name in ("dict", "expiring"):
+        r = res[name]
+        per_op = r["seconds"] / res["events"] * 1e9
+        print(f"{name:<10} {r['seconds']:>7.2f} с ({per_op:.0f} нс/подія)  "
+              f"записів: {r['size']:>9,}  пам'ять: {r['memory_mb']:>7.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
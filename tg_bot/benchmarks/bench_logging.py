@@ -0,0 +1,109 @@
+﻿"""
+Бенчмарк зависань event loop під час сплесків логів.
+
+Поки "хендлери" пишуть пачки логів, окрема задача-пульс кожну 1 мс
+міряє, наскільки пізно її розбудив loop. Порівнює старе підключення
+(StreamHandler + RotatingFileHandler прямо на root) з черговим (logs.py).
+Маленький maxBytes змушує файл ротуватись, як bot.log під навантаженням.
+
+    python -m benchmarks.bench_logging --bursts 50 --burst-size 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+from logs import LOG_FORMAT, log_stats, setup_queue_logging, stop_queue_logging
+
+
+def _handlers(workdir: str, max_bytes: int) -> list:
+    formatter = logging.Formatter(LOG_FORMAT)
+    console = logging.StreamHandler(open(os.path.join(workdir, "console.log"), "w", encoding="utf-8"))
+    file_handler = RotatingFileHandler(os.path.join(workdir, "bot.log"), maxBytes=max_bytes,
+                                       backupCount=1, encoding="utf-8")
+    for h in (console, file_handler):
+        h.setFormatter(formatter)
+    return [console, file_handler]
+
+
+async def _heartbeat(lateness: list, stop: asyncio.Event, period: float = 0.001):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + period
+        await asyncio.sleep(period)
+        lateness.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def _bursts(bursts: int, burst_size: int, pause: float):
+    log = logging.getLogger("bench.handlers")
+    event_log = logging.getLogger("aiogram.event")
+    for b in range(bursts):
+        for i in range(burst_size):
+            log.info(f"🧹 Перевірка поїздки {b}:{i} Київ -> Львів")
+            event_log.info("Update id=%s is %s. Duration %d ms by bot id=%d", b * burst_size + i, "handled", 12, 1)
+        await asyncio.sleep(pause)
+
+
+async def _run(bursts: int, burst_size: int, pause: float) -> dict:
+    lateness, stop = [], asyncio.Event()
+    beat = asyncio.create_task(_heartbeat(lateness, stop))
+    started = time.perf_counter()
+    await _bursts(bursts, burst_size, pause)
+    emit_s = time.perf_counter() - started
+    stop.set()
+    await beat
+    lateness.sort()
+    return {"emit_s": emit_s, "max_ms": lateness[-1], "p99_ms": lateness[int(len(lateness) * 0.99)],
+            "mean_ms": statistics.fmean(lateness)}
+
+
+def run_mode(mode: str, bursts: int, burst_size: int, pause: float, max_bytes: int, sample: float) -> dict:
+    root = logging.getLogger()
+    with tempfile.TemporaryDirectory() as workdir:
+        handlers = _handlers(workdir, max_bytes)
+        if mode == "direct":
+            for h in handlers: root.addHandler(h)
+            root.setLevel(logging.INFO)
+        else:
+            setup_queue_logging(handlers, update_sample_rate=sample)
+        try:
+            result = asyncio.run(_run(bursts, burst_size, pause))
+            drain = time.perf_counter()
+            stop_queue_logging()   # чекаємо, поки потік допише чергу
+            result["drain_s"] = time.perf_counter() - drain
+        finally:
+            stop_queue_logging()
+            for h in root.handlers[:]: root.removeHandler(h)
+            for f in logging.getLogger("aiogram.event").filters[:]: logging.getLogger("aiogram.event").removeFilter(f)
+            for h in handlers: h.close()
+    return result
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Зависання loop при сплесках логів: пряме vs чергове логування")
+    p.add_argument("--bursts", type=int, default=50)
+    p.add_argument("--burst-size", type=int, default=500, help="записів за один сплеск (без await)")
+    p.add_argument("--pause-ms", type=float, default=20)
+    p.add_argument("--max-bytes", type=int, default=1024 * 1024, help="поріг ротації файлу")
+    p.add_argument("--sample", type=float, default=0.05, help="частка 'Update ... handled' у режимі queue+sample")
+    args = p.parse_args(argv)
+
+    modes = (("direct", 1.0), ("queue", 1.0), ("queue+sample", args.sample))
+    records = args.bursts * args.burst_size * 2
+    print(f"📝 {records:,} записів: {args.bursts} сплесків по {args.burst_size * 2}, ротація кожні {args.max_bytes // 1024} KB")
+    print(f"{'режим':<14} {'emit, с':>8} {'пульс max':>10} {'p99':>8} {'сер.':>7} {'дозапис, с':>11}")
+    for mode, sample in modes:
+        log_stats.clear()
+        r = run_mode(mode.split("+")[0], args.bursts, args.burst_size, args.pause_ms / 1000, args.max_bytes, sample)
+        print(f"{mode:<14} {r['emit_s']:>8.2f} {r['max_ms']:>8.1f}мс {r['p99_ms']:>6.1f}мс {r['mean_ms']:>5.2f}мс "
+              f"{r['drain_s']:>11.2f}" + (f"   {dict(log_stats)}" if log_stats else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+﻿"""
+Бенчмарк старту бота: скільки коштує `import main` і перевірка схеми.
+
+Кожен прогін — окремий інтерпретатор з `-X importtime`, тож кеш модулів
+не заважає (кеш .pyc на диску лишається, як і на проді після першого запуску).
+Показує медіану загального часу імпорту, найдорожчі пакети верхнього рівня
+і час ensure_schema_current() / migrate() на актуальній базі.
+
+    python -m benchmarks.bench_startup --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_profile(module: str = "main") -> tuple:
+    """(сумарно мкс, {пакет верхнього рівня: мкс}, set завантажених модулів)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BOT_DIR, capture_output=True, text=True, check=True)
+    total = 0
+    packages = defaultdict(int)
+    modules = set()
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m: continue
+        self_us, cumulative_us, indent, name = int(m[1]), int(m[2]), len(m[3]), m[4]
+        modules.add(name)
+        packages[name.split(".")[0]] += self_us
+        if indent == 1:
+            total += cumulative_us
+    return total, packages, modules
+
+
+def schema_check_ms(runs: int = 20) -> dict:
+    from migrate import migrate, ensure_schema_current
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        migrate(path, verbose=False)
+        out = {}
+        for name, fn in (("ensure_schema_current", lambda: ensure_schema_current(path)),
+                         ("migrate (актуальна)", lambda: migrate(path, verbose=False))):
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - started) * 1000)
+            out[name] = round(statistics.median(samples), 2)
+        return out
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Час імпорту main.py та перевірки схеми")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--module", default="main")
+    args = p.parse_args(argv)
+
+    totals, per_package, modules = [], defaultdict(list), set()
+    for _ in range(args.runs):
+        total, packages, modules = import_profile(args.module)
+        totals.append(total)
+        for name, us in packages.items():
+            per_package[name].append(us)
+
+    print(f"🚀 import {args.module}: медіана {statistics.median(totals) / 1000:.0f} мс "
+          f"(мін {min(totals) / 1000:.0f}, макс {max(totals) / 1000:.0f}), {len(modules)} модулів")
+    ranked = sorted(per_package.items(), key=lambda kv: statistics.median(kv[1]), reverse=True)
+    for name, samples in ranked[:args.top]:
+        print(f"   {name:<24} {statistics.median(samples) / 1000:>8.1f} мс")
+
+    lazy = [m for m in ("thefuzz", "geopy", "sentry_sdk") if m in modules]
+    print(f"💤 Ліниві модулі при старті: {', '.join(lazy) if lazy else 'не завантажені ✅'}")
+
+    for name, ms in schema_check_ms().items():
+        print(f"🔧 {name:<24} {ms:>8.2f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+﻿"""
+Бенчмарк накладних витрат Sentry tracing на один апдейт.
+
+Ганяє TracingMiddleware з фіктивним хендлером (без мережі: транспорт лише
+рахує конверти) у кількох режимах і показує мкс/апдейт понад "без tracing"
+та скільки транзакцій реально пішло б у Sentry. Кожен режим — окремий
+процес, бо sentry_sdk.init і профайлер глобальні.
+
+    python -m benchmarks.bench_tracing --updates 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "off":             None,
+    "head 1%":         {"default_rate": 0.01, "tail": False},
+    "head 100%":       {"default_rate": 1.0, "tail": False},
+    "head 100%+prof":  {"default_rate": 1.0, "tail": False, "profiles_rate": 1.0},
+    "tail 1%":         {"default_rate": 0.01, "tail": True},
+}
+
+
+async def passenger_search(event, data):
+    # Імітація хендлера: трохи CPU і один await (як виклик БД через to_thread)
+    sum(range(200))
+    if data.get("slow"):
+        await asyncio.sleep(data["slow"])
+    if data.get("fail"):
+        raise RuntimeError("boom")
+    await asyncio.sleep(0)
+passenger_search.__module__ = "handlers.passenger"
+
+
+async def _drive(middleware, updates: int, slow_every: int, slow_s: float, fail_every: int) -> float:
+    handler_obj = SimpleNamespace(callback=passenger_search)
+    started = time.perf_counter()
+    for i in range(updates):
+        data = {"handler": handler_obj}
+        if slow_every and i % slow_every == slow_every - 1: data["slow"] = slow_s
+        if fail_every and i % fail_every == fail_every - 1: data["fail"] = True
+        try:
+            if middleware is None: await passenger_search(None, data)
+            else: await middleware(passenger_search, None, data)
+        except RuntimeError:
+            pass
+    return time.perf_counter() - started
+
+
+def run_scenario(name: str, updates: int, mixed: int, slow_ms: float) -> dict:
+    params = SCENARIOS[name]
+    envelopes = {"transaction": 0, "profile": 0}
+    middleware = None
+
+    if params is not None:
+        import sentry_sdk
+        from sentry_sdk.transport import Transport
+        from tracing import TracingConfig, TracingMiddleware, init_sentry, tracing_stats
+
+        class CountingTransport(Transport):
+            def capture_envelope(self, envelope):
+                for item in envelope.items:
+                    if item.type in envelopes: envelopes[item.type] += 1
+
+        config = TracingConfig(rules=[], slow_ms=slow_ms, **params)
+        init_sentry("https://public@sentry.invalid/1", config, transport=CountingTransport)
+        middleware = TracingMiddleware(config)
+
+    random.seed(1)
+    # 1) чисті накладні витрати: лише швидкі апдейти
+    seconds = asyncio.run(_drive(middleware, updates, 0, 0, 0))
+    fast_tx = envelopes["transaction"]
+    # 2) суміш: кожен 50-й повільний, кожен 100-й з помилкою — що доїде до Sentry
+    asyncio.run(_drive(middleware, mixed, 50, slow_ms / 1000 * 1.2, 100))
+    if params is not None:
+        sentry_sdk.flush()
+    return {"us_per_update": seconds / updates * 1e6, "fast_sent": fast_tx,
+            "mixed_sent": envelopes["transaction"] - fast_tx, "profiles": envelopes["profile"],
+            "mixed_slow": mixed // 50, "mixed_errors": mixed // 100}
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Накладні витрати TracingMiddleware на апдейт")
+    p.add_argument("--updates", type=int, default=20_000)
+    p.add_argument("--mixed", type=int, default=500, help="апдейтів у суміші з повільними/помилками")
+    p.add_argument("--slow-ms", type=float, default=50, help="поріг повільного апдейту")
+    p.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.updates, args.mixed, args.slow_ms)))
+        return 0
+
+    results = {}
+    for name in SCENARIOS:
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_tracing", "--scenario", name,
+                              "--updates", str(args.updates), "--mixed", str(args.mixed),
+                              "--slow-ms", str(args.slow_ms)],
+                             cwd=BOT_DIR, capture_output=True, text=True, check=True)
+        results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    base = results["off"]["us_per_update"]
+    print(f"🔭 {args.updates:,} швидких апдейтів; суміш {args.mixed}: "
+          f"{args.mixed // 50} повільних (>{args.slow_ms:.0f} мс), {args.mixed // 100} з помилкою")
+    print(f"{'режим':<16} {'мкс/апдейт':>11} {'+мкс':>8} {'tx (швидкі)':>12} {'tx (суміш)':>11} {'профілі':>8}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['us_per_update']:>11.1f} {r['us_per_update'] - base:>8.1f} "
+              f"{r['fast_sent']:>12,} {r['mixed_sent']:>11,} {r['profiles']:>8,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
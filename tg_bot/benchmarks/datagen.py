@@ -0,0 +1,225 @@
+﻿"""
+Генератор синтетичних даних у форматі нашої бази.
+
+Дані схожі на продакшн: маршрути навколо Львова, пікові години виїздів,
+частка заброньованих місць, листування між пасажирами та водіями,
+нерівномірна популярність міст. Результат детермінований (seed + дата відліку),
+тож benchmarks/bench_db.py і benchmarks/loadtest.py бачать однакові дані.
+
+    python -m benchmarks.datagen /tmp/big.db --scale 1.0
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Обсяги при scale=1.0
+BASE_VOLUMES = {
+    "users": 100_000,
+    "trips": 50_000,
+    "chat_messages": 500_000,
+    "searches": 1_000_000,   # згортаються в recent_searches
+}
+
+HUB = "Львів"
+
+# Популярність напрямків зі Львова (вага ~ частка поїздок)
+DESTINATIONS = {
+    "Київ": 30, "Стрий": 12, "Дрогобич": 10, "Яворів": 8, "Тернопіль": 8,
+    "Івано-Франківськ": 7, "Луцьк": 5, "Рівне": 5, "Самбір": 4, "Трускавець": 3,
+    "Жовква": 3, "Мукачево": 2, "Ужгород": 2, "Хмельницький": 2, "Червоноград": 2,
+}
+
+# Години виїзду: ранковий та вечірній піки
+HOUR_WEIGHTS = [0, 0, 0, 0, 1, 3, 9, 12, 10, 5, 3, 3, 3, 3, 4, 6, 9, 12, 11, 7, 4, 2, 1, 0]
+
+DRIVER_SHARE = 0.2
+BOOKED_SEAT_RATE = 0.55
+CANCELLED_TRIP_RATE = 0.08
+HISTORY_DAYS = 60      # поїздки в минулому
+FUTURE_DAYS = 4        # kb_dates показує 4 дні наперед
+RECENT_SLOTS = 5       # database.RECENT_SEARCHES_SLOTS
+
+CARS = [("Skoda Octavia", "сіра"), ("VW Passat", "синій"), ("Renault Megane", "білий"),
+        ("Toyota Corolla", "чорна"), ("Mercedes Sprinter", "білий"), ("Hyundai Elantra", "червона")]
+REF_SOURCES = [None] * 8 + ["instagram", "tiktok", "group_lviv", "ref_1"]
+CHAT_PHRASES = ["Добрий день! Місце ще є?", "Де вас чекати?", "Я на місці", "Запізнююсь на 5 хв",
+                "Дякую, до зустрічі!", "Можна з валізою?", "Буду біля вокзалу"]
+
+
+def scaled_volumes(scale: float) -> dict:
+    return {k: max(10, int(v * scale)) for k, v in BASE_VOLUMES.items()}
+
+
+class _Gen:
+    def __init__(self, rng: random.Random, now: datetime):
+        self.rng = rng
+        self.now = now
+        routes, weights = [], []
+        for city, w in DESTINATIONS.items():
+            routes += [(HUB, city), (city, HUB)]
+            weights += [w, w * 0.9]   # у Львів їдуть трохи рідше, ніж зі Львова
+        self.routes, self.route_cum = routes, list(itertools.accumulate(weights))
+
+    def route(self):
+        return self.rng.choices(self.routes, cum_weights=self.route_cum)[0]
+
+    def hour(self):
+        return self.rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+
+    def ts(self, max_days_ago: float, min_days_ago: float = 0.0) -> str:
+        seconds = self.rng.uniform(min_days_ago * 86400, max_days_ago * 86400)
+        return (self.now - timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate(conn: sqlite3.Connection, scale: float = 1.0, seed: int = 42, now: datetime = None) -> dict:
+    """
+    Наповнює вже створену (init_db) базу. Все пишеться через executemany
+    в одній транзакції. Повертає кількість вставлених рядків по таблицях.
+    """
+    volumes = scaled_volumes(scale)
+    now = now or datetime.now(timezone.utc)
+    rng = random.Random(seed)
+    g = _Gen(rng, now)
+
+    n_users = volumes["users"]
+    n_drivers = max(1, int(n_users * DRIVER_SHARE))
+    driver_ids = list(range(1, n_drivers + 1))
+    passenger_ids = list(range(n_drivers + 1, n_users + 1)) or driver_ids
+
+    # 👤 Користувачі
+    def users():
+        for uid in range(1, n_users + 1):
+            is_driver = uid <= n_drivers
+            model, color = rng.choice(CARS) if is_driver else ("-", "-")
+            yield (uid, f"@user{uid}", f"Користувач {uid}", f"+38067{uid % 10_000_000:07d}",
+                   model, f"BC{uid % 10000:04d}AA" if is_driver else "-", color,
+                   round(rng.uniform(4.2, 5.0), 2), round(rng.uniform(4.5, 5.0), 2),
+                   1 if rng.random() < 0.97 else 0, rng.choice(REF_SOURCES),
+                   1 if rng.random() < 0.04 else 0, g.ts(365), g.ts(30))
+
+    # 🚗 Поїздки + 🎫 бронювання (узгоджені: seats_taken == кількість активних броней)
+    trips, bookings = [], []
+    # Популярні водії возять частіше (Pareto)
+    driver_weights = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(n_drivers)))
+    for i in range(volumes["trips"]):
+        origin, dest = g.route()
+        day_offset = rng.randint(-HISTORY_DAYS, FUTURE_DAYS - 1)
+        trip_day = now + timedelta(days=day_offset)
+        if day_offset < 0:
+            status = "cancelled" if rng.random() < CANCELLED_TRIP_RATE else "finished"
+        else:
+            status = "active"
+        seats_total = rng.choice((3, 4, 4, 4, 6, 8))
+        taken = sum(rng.random() < BOOKED_SEAT_RATE for _ in range(seats_total))
+        if status == "active" and day_offset > 0:
+            taken = min(taken, seats_total - 1)  # майбутні поїздки ще не заповнені
+        trip_id = f"g{i:08d}"
+        driver = rng.choices(driver_ids, cum_weights=driver_weights)[0]
+        price = 150 if dest != "Київ" and origin != "Київ" else 600
+        trips.append((trip_id, driver, origin, dest, trip_day.strftime("%d.%m"),
+                      f"{g.hour():02d}:{rng.choice((0, 15, 30, 45)):02d}",
+                      seats_total, taken if status != "cancelled" else 0,
+                      price + rng.choice((-50, 0, 0, 50)), status, ""))
+        booking_status = "cancelled" if status == "cancelled" else "active"
+        booked_days_ago = max(0.0, -day_offset) + rng.uniform(0, 3)
+        for p in rng.sample(passenger_ids, min(taken, len(passenger_ids))):
+            bookings.append((trip_id, p, booking_status, 1 if day_offset < 0 else 0,
+                             g.ts(booked_days_ago + 0.5, booked_days_ago)))
+
+    # 💬 Чати: переважно між пасажиром і водієм заброньованої поїздки
+    trip_driver = {t[0]: t[1] for t in trips}
+
+    def chat_messages():
+        for _ in range(volumes["chat_messages"]):
+            if bookings and rng.random() < 0.9:
+                b = bookings[rng.randrange(len(bookings))]
+                a, c = b[1], trip_driver[b[0]]
+                if rng.random() < 0.5: a, c = c, a
+            else:
+                a, c = rng.randint(1, n_users), rng.randint(1, n_users)
+            yield (a, c, rng.choice(CHAT_PHRASES), g.ts(14), 1 if rng.random() < 0.8 else 0)
+
+    # 🔍 Пошуки: популярні маршрути за останні кілька днів, згорнуті в кільце
+    # останніх RECENT_SLOTS різних маршрутів юзера (як database.save_search_history)
+    def recent_searches():
+        last = {}
+        for _ in range(volumes["searches"]):
+            origin, dest = g.route()
+            routes = last.setdefault(rng.choice(passenger_ids), {})
+            ts = g.ts(4)
+            routes[(origin, dest)] = max(ts, routes.get((origin, dest), ts))
+        for uid, routes in last.items():
+            newest = sorted(routes.items(), key=lambda kv: kv[1], reverse=True)[:RECENT_SLOTS]
+            for slot, ((origin, dest), ts) in enumerate(newest):
+                yield (uid, slot, origin, dest, ts)
+
+    cities = {HUB: 0, **{c: 0 for c in DESTINATIONS}}
+    for t in trips:
+        cities[t[2]] += 1
+        cities[t[3]] += 1
+
+    ratings = [(b[1], trip_driver[b[0]], b[0], "driver", rng.choices((5, 4, 3, 2, 1), weights=(70, 20, 6, 2, 2))[0], b[4])
+               for b in bookings if b[3] == 1 and rng.random() < 0.4]
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, name, phone, model, number, color, rating_driver, rating_pass, "
+            "terms_accepted, ref_source, is_blocked_bot, created_at, last_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            users()
+        )
+        conn.executemany(
+            "INSERT INTO trips (id, user_id, origin, destination, date, time, seats_total, seats_taken, price, status, description) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", trips
+        )
+        conn.executemany(
+            "INSERT INTO bookings (trip_id, passenger_id, status, reminded, created_at) VALUES (?, ?, ?, ?, ?)", bookings
+        )
+        conn.executemany(
+            "INSERT INTO chat_history (sender_id, receiver_id, message, timestamp, is_read) VALUES (?, ?, ?, ?, ?)",
+            chat_messages()
+        )
+        conn.executemany(
+            "INSERT INTO recent_searches (user_id, slot, origin, destination, ts) VALUES (?, ?, ?, ?, ?)", recent_searches()
+        )
+        n_recent = conn.execute("SELECT COUNT(*) FROM recent_searches").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO cities (name, search_count) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET search_count = excluded.search_count",
+            cities.items()
+        )
+        conn.executemany(
+            "INSERT INTO ratings (from_user_id, to_user_id, trip_id, role, score, timestamp) VALUES (?, ?, ?, ?, ?, ?)", ratings
+        )
+
+    return {
+        "users": n_users, "trips": len(trips), "bookings": len(bookings),
+        "chat_messages": volumes["chat_messages"], "recent_searches": n_recent,
+        "ratings": len(ratings), "cities": len(cities),
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Синтетична база даних у продакшн-масштабі")
+    p.add_argument("db_path")
+    p.add_argument("--scale", type=float, default=1.0)
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args(argv)
+
+    os.environ["DB_PATH"] = args.db_path
+    import database
+    database.init_db()
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(args.db_path)
+    counts = generate(conn, scale=args.scale, seed=args.seed)
+    conn.close()
+    print(f"✅ {args.db_path}: {counts} за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+﻿import asyncio
+import json
+import time
+from aiohttp import web
+
+# ==========================================
+# 🛰 ЛОКАЛЬНИЙ FAKE TELEGRAM API
+# ==========================================
+# Мінімальний HTTP-сервер, який відповідає на виклики Bot API так,
+# як це робить Telegram. Працює повністю офлайн (127.0.0.1),
+# тож навантажувальні тести можна ганяти в CI.
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+
+
+class FakeTelegramServer:
+    """
+    Зберігає "видимі" повідомлення кожного чату, щоб віртуальні користувачі
+    могли натискати кнопки так само, як справжні люди.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.chats = {}          # chat_id -> {message_id: {"text": ..., "reply_markup": ...}}
+        self.calls = {}          # api_method -> кількість викликів
+        self._next_id = 1
+        self._runner = None
+        self.base_url = None
+
+    # ---------- життєвий цикл ----------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        real_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{real_port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    # ---------- API для віртуальних користувачів ----------
+
+    def find_buttons(self, chat_id: int, prefix: str):
+        """Всі (message_id, callback_data) з потрібним префіксом, від найновіших."""
+        found = []
+        messages = self.chats.get(chat_id, {})
+        for mid in sorted(messages, reverse=True):
+            markup = messages[mid].get("reply_markup") or {}
+            for row in markup.get("inline_keyboard", []):
+                for btn in row:
+                    data = btn.get("callback_data")
+                    if data and data.startswith(prefix):
+                        found.append((mid, data))
+        return found
+
+    def message_text(self, chat_id: int, message_id: int) -> str:
+        return self.chats.get(chat_id, {}).get(message_id, {}).get("text", "")
+
+    # ---------- обробка запитів ----------
+
+    def _new_message(self, chat_id, text=None, reply_markup=None):
+        mid = self._next_id
+        self._next_id += 1
+        self.chats.setdefault(chat_id, {})[mid] = {"text": text or "", "reply_markup": reply_markup}
+        return self._message_dict(chat_id, mid)
+
+    def _message_dict(self, chat_id, mid):
+        stored = self.chats.get(chat_id, {}).get(mid, {})
+        msg = {
+            "message_id": mid,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": stored.get("text") or "…",
+        }
+        if stored.get("reply_markup"):
+            msg["reply_markup"] = stored["reply_markup"]
+        return msg
+
+    async def _handle(self, request: web.Request):
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        form = await request.post()
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = self._dispatch(method, form)
+        return web.json_response({"ok": True, "result": result})
+
+    def _dispatch(self, method: str, form):
+        chat_id = int(form["chat_id"]) if "chat_id" in form else None
+        markup = json.loads(form["reply_markup"]) if "reply_markup" in form else None
+        if markup and "inline_keyboard" not in markup:
+            markup = None  # Reply-клавіатури кнопок для callback не мають
+
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "sendDocument"):
+            return self._new_message(chat_id, form.get("text") or form.get("caption"), markup)
+        if method == "copyMessage":
+            return {"message_id": self._new_message(chat_id, form.get("caption"), markup)["message_id"]}
+        if method == "editMessageText":
+            mid = int(form["message_id"])
+            self.chats.setdefault(chat_id, {})[mid] = {"text": form.get("text", ""), "reply_markup": markup}
+            return self._message_dict(chat_id, mid)
+        if method == "deleteMessage":
+            self.chats.get(chat_id, {}).pop(int(form["message_id"]), None)
+            return True
+        # answerCallbackQuery, deleteWebhook та інші "службові" методи
+        return True
@@ -0,0 +1,371 @@
+﻿"""
+Навантажувальний тест: проганяє синтетичні апдейти Telegram через Dispatcher.
+
+Запуск (з папки tg_bot):
+    python -m benchmarks.loadtest --passengers 200 --drivers 50 --concurrency 20
+
+Все працює офлайн: бот ходить у локальний fake Telegram API (benchmarks/fake_telegram.py),
+база — тимчасовий файл. Код виходу != 0, якщо хоч один сценарій зламався.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+# База має бути тимчасовою ще ДО імпорту config/database
+_TMP_DIR = tempfile.mkdtemp(prefix="loadtest_")
+os.environ["DB_PATH"] = os.path.join(_TMP_DIR, "loadtest.db")
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+import database
+from benchmarks import datagen
+from benchmarks.fake_telegram import FakeTelegramServer, BOT_USER
+
+FAKE_TOKEN = "100000001:LOADTEST-offline-token"
+SEED_CITIES = ["Львів", "Київ", "Стрий", "Яворів", "Дрогобич", "Тернопіль"]
+
+# ==========================================
+# 📏 МЕТРИКИ
+# ==========================================
+
+class Metrics:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.failed_journeys = []
+        self.lock_waits = 0
+        self.lock_wait_time = 0.0
+        self.lock_wait_max = 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies: return 0.0
+        data = sorted(self.latencies)
+        idx = min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))
+        return data[idx]
+
+
+class _ErrorCounter(logging.Handler):
+    """Рахує помилки, які глобальний error handler лише логує."""
+    def __init__(self, metrics: Metrics):
+        super().__init__(level=logging.ERROR)
+        self.metrics = metrics
+
+    def emit(self, record):
+        self.metrics.errors += 1
+
+# ==========================================
+# 🔒 ОЧІКУВАННЯ БЛОКУВАНЬ БД
+# ==========================================
+
+class _LockTimedConnection:
+    """
+    Обгортка над sqlite3.Connection: вимикає вбудований busy_timeout
+    і сама повторює запит, поки база заблокована, рахуючи час очікування.
+    """
+    RETRY_SLEEP = 0.001
+    MAX_WAIT = 30.0
+
+    def __init__(self, conn, metrics: Metrics):
+        self._conn = conn
+        self._metrics = metrics
+        conn.execute("PRAGMA busy_timeout = 0;")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._retry(self._conn.__exit__, *exc)
+
+    def execute(self, *args):
+        return self._retry(self._conn.execute, *args)
+
+    def executemany(self, *args):
+        return self._retry(self._conn.executemany, *args)
+
+    def commit(self):
+        return self._retry(self._conn.commit)
+
+    def _retry(self, fn, *args):
+        started = None
+        try:
+            while True:
+                try:
+                    return fn(*args)
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) and "busy" not in str(e):
+                        raise
+                    now = time.perf_counter()
+                    if started is None:
+                        started = now
+                    elif now - started > self.MAX_WAIT:
+                        raise
+                    time.sleep(self.RETRY_SLEEP)
+        finally:
+            if started is not None:
+                waited = time.perf_counter() - started
+                self._metrics.lock_waits += 1
+                self._metrics.lock_wait_time += waited
+                self._metrics.lock_wait_max = max(self._metrics.lock_wait_max, waited)
+
+
+# ==========================================
+# 🌍 ОФЛАЙН ГЕОКОДЕР
+# ==========================================
+
+class _OfflineGeocoder:
+    """Замість Nominatim: знає лише міста з SEED_CITIES (без мережі)."""
+    class _Location:
+        def __init__(self, address): self.address = address
+
+    def geocode(self, query, language=None):
+        name = query.split(",")[0].strip()
+        return self._Location(f"{name}, Україна") if name in SEED_CITIES else None
+
+
+def instrument_lock_waits(metrics: Metrics):
+    original = database.get_connection
+    database.get_connection = lambda: _LockTimedConnection(original(), metrics)
+
+# ==========================================
+# 🌱 ПІДГОТОВКА ДАНИХ
+# ==========================================
+
+def trip_date(days_ahead: int = 1) -> str:
+    """Дата в тому ж форматі, що й kb_dates (Київський час)."""
+    now = datetime.now(pytz.timezone('Europe/Kyiv'))
+    return (now + timedelta(days=days_ahead)).strftime("%d.%m")
+
+
+def register_user(user_id: int, name: str, username=None, **profile):
+    database.save_user(user_id, name, username, **profile)
+
+
+def seed_database(scale: float, trips_per_route: int):
+    """Фонові дані з datagen + гарантовані поїздки для сценаріїв на завтра."""
+    database.init_db()
+    conn = sqlite3.connect(database.DB_FILE)
+    datagen.generate(conn, scale=scale)
+    conn.close()
+    for city in SEED_CITIES:
+        database.add_or_update_city(city)
+    database.load_user_flags()
+
+    date = trip_date()
+    driver_ids = itertools.count(900_000_000)
+    for origin, dest in [("Львів", "Київ"), ("Львів", "Яворів"), ("Київ", "Львів")]:
+        for i in range(trips_per_route):
+            driver_id = next(driver_ids)
+            register_user(driver_id, f"Водій {driver_id}", phone="+380670000000",
+                          model="Skoda Octavia", number="BC0000AA", color="сіра")
+            database.save_trip(f"seed{driver_id}", driver_id, origin, dest, date,
+                               f"{6 + i % 16:02d}:{(i * 5) % 60:02d}", 8, 200)
+
+# ==========================================
+# 🤖 ВІРТУАЛЬНИЙ КОРИСТУВАЧ
+# ==========================================
+
+class JourneyFailed(Exception):
+    pass
+
+
+class VirtualUser:
+    _update_ids = itertools.count(1)
+
+    def __init__(self, user_id: int, dp, bot: Bot, server: FakeTelegramServer, metrics: Metrics, think: float):
+        self.user_id = user_id
+        self.dp, self.bot, self.server, self.metrics = dp, bot, server, metrics
+        self.think = think
+        self.rng = random.Random(user_id)
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+        self.chat = {"id": user_id, "type": "private", "first_name": f"User{user_id}"}
+
+    async def _feed(self, payload: dict):
+        update = {"update_id": next(self._update_ids), **payload}
+        started = time.perf_counter()
+        await self.dp.feed_raw_update(self.bot, update)
+        self.metrics.latencies.append(time.perf_counter() - started)
+        if self.think:
+            await asyncio.sleep(self.think)
+
+    async def send_text(self, text: str):
+        await self._feed({"message": {
+            "message_id": self.server._next_id + 10_000_000,
+            "date": int(time.time()), "chat": self.chat, "from": self.user, "text": text,
+        }})
+
+    async def press(self, prefix: str, optional: bool = False, pick_random: bool = False):
+        found = self.server.find_buttons(self.user_id, prefix)
+        if not found:
+            if optional: return False
+            raise JourneyFailed(f"немає кнопки '{prefix}'")
+        mid, data = self.rng.choice(found) if pick_random else found[0]
+        await self._feed({"callback_query": {
+            "id": str(next(self._update_ids)), "from": self.user, "chat_instance": str(self.user_id),
+            "data": data,
+            "message": {
+                "message_id": mid, "date": int(time.time()), "chat": self.chat, "from": BOT_USER,
+                "text": self.server.message_text(self.user_id, mid) or "…",
+            },
+        }})
+        return True
+
+    async def start(self):
+        await self.send_text("/start")
+        await self.press("terms_ok", optional=True)
+
+# ==========================================
+# 🧭 СЦЕНАРІЇ
+# ==========================================
+
+async def passenger_journey(u: VirtualUser):
+    """Пошук → пагінація → бронювання → чат → скасування."""
+    register_user(u.user_id, u.user["first_name"], f"@{u.user['username']}", phone="+380991112233")
+    await u.start()
+    await u.press("role_passenger")
+    await u.press("pass_find")
+    await u.send_text("Львів")
+    await u.send_text("Київ")
+    await u.press(f"sdate_{trip_date()}")
+    await u.press("page_next", optional=True)
+    await u.press("book_", pick_random=True)
+    await u.press("chat_start_")
+    await u.send_text("Добрий день! Буду вчасно.")
+    await u.press("chat_leave")
+    await u.press("pass_my_books")
+    await u.press("ask_cancel_bk_")
+    await u.press("conf_cancel_bk_")
+
+
+async def driver_journey(u: VirtualUser):
+    """Створення поїздки водієм."""
+    register_user(u.user_id, u.user["first_name"], f"@{u.user['username']}", phone="+380501112233",
+                  model="VW Passat", number="BC1234AA", color="синій")
+    await u.start()
+    await u.press("role_driver")
+    await u.press("drv_create")
+    await u.press("drv_new_route", optional=True)
+    await u.send_text("Львів")
+    await u.send_text("Стрий")
+    await u.press(f"tripdate_{trip_date()}")
+    await u.send_text("18:30")
+    await u.send_text("3")
+    await u.send_text("250")
+    await u.press("skip_desc")
+
+# ==========================================
+# 🚀 ЗАПУСК
+# ==========================================
+
+async def run(args) -> dict:
+    from main import build_dispatcher
+    from activity import activity_tracker
+    from events import event_log
+
+    metrics = Metrics()
+    logging.getLogger().addHandler(_ErrorCounter(metrics))
+    seed_database(args.scale, args.trips_per_route)
+    instrument_lock_waits(metrics)
+
+    import utils
+    utils.geolocator = _OfflineGeocoder()
+
+    server = FakeTelegramServer(latency_ms=args.api_latency_ms)
+    base_url = await server.start()
+    session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    bot = Bot(token=FAKE_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = build_dispatcher(antiflood=args.antiflood)
+    if args.outbound:
+        from sender import OutboundScheduler, sender_stats
+        bot.session.middleware(OutboundScheduler())
+
+    ids = itertools.count(500_000_000)
+    jobs = [passenger_journey] * args.passengers + [driver_journey] * args.drivers
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_one(journey):
+        async with semaphore:
+            u = VirtualUser(next(ids), dp, bot, server, metrics, args.think_ms / 1000)
+            try:
+                await journey(u)
+            except Exception as e:
+                metrics.failed_journeys.append(f"{journey.__name__}[{u.user_id}]: {e}")
+
+    background = [asyncio.create_task(activity_tracker.run()), asyncio.create_task(event_log.run())]
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(j) for j in jobs))
+    elapsed = time.perf_counter() - started
+    for task in background: task.cancel()
+    await activity_tracker.flush()
+    await event_log.flush()
+
+    await bot.session.close()
+    await server.stop()
+
+    return {
+        "journeys": len(jobs),
+        "failed_journeys": len(metrics.failed_journeys),
+        "updates": len(metrics.latencies),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(metrics.latencies) / elapsed, 1) if elapsed else 0,
+        "latency_ms": {p: round(metrics.percentile(q) * 1000, 2) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "handler_errors": metrics.errors,
+        "db_lock_waits": metrics.lock_waits,
+        "db_lock_wait_ms": round(metrics.lock_wait_time * 1000, 2),
+        "db_lock_wait_max_ms": round(metrics.lock_wait_max * 1000, 2),
+        "api_calls": dict(sorted(server.calls.items())),
+        **({"outbound": dict(sender_stats)} if args.outbound else {}),
+        "caches": {"search": database.search_cache.stats(), "users": database.user_cache.stats()},
+        "failures": metrics.failed_journeys[:10],
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Load test: синтетичні апдейти через Dispatcher")
+    p.add_argument("--passengers", type=int, default=100, help="кількість сценаріїв пасажира")
+    p.add_argument("--drivers", type=int, default=20, help="кількість сценаріїв водія")
+    p.add_argument("--concurrency", type=int, default=10, help="одночасних користувачів")
+    p.add_argument("--think-ms", type=float, default=0.0, help="пауза між діями користувача")
+    p.add_argument("--api-latency-ms", type=float, default=0.0, help="штучна затримка fake Telegram API")
+    p.add_argument("--scale", type=float, default=0.01, help="обсяг фонових даних datagen (1.0 = продакшн-масштаб)")
+    p.add_argument("--trips-per-route", type=int, default=10)
+    p.add_argument("--antiflood", action="store_true", help="увімкнути AntiFloodMiddleware (потребує --think-ms)")
+    p.add_argument("--outbound", action="store_true", help="пропускати відправки через sender.OutboundScheduler")
+    p.add_argument("--json", help="зберегти звіт у файл")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    report = asyncio.run(run(args))
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report["failed_journeys"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+﻿import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# ==========================================
+# ⏳ СЛОВНИК З ТЕРМІНОМ ЖИТТЯ (TTL)
+# ==========================================
+
+class ExpiringMap:
+    """
+    Обмежений словник з TTL для кешів "user_id -> щось".
+
+    Записи лежать у часових кошиках шириною bucket_width секунд.
+    Протермінований кошик викидається цілком, тому очистка коштує O(1)
+    амортизовано на запис. Запис живе щонайменше ttl і не довше за
+    ttl + bucket_width. При переповненні (max_size) першими вилітають
+    записи з найстаршого кошика.
+    """
+
+    def __init__(self, ttl: float, max_size: int = None, bucket_width: float = None, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.bucket_width = bucket_width or max(ttl / 8, 0.05)
+        self._clock = clock
+        self._index = {}         # key -> кошик (dict), де лежить актуальне значення
+        self._buckets = deque()  # [(bucket_id, {key: value})], від старших до новіших
+        self._evict_order = None # (bucket_id, deque ключів) — черга витіснення найстаршого кошика
+        self.evicted = 0
+
+    # ---------- базові операції ----------
+
+    def __setitem__(self, key, value):
+        now = self._clock()
+        self._expire(now)
+        bucket = self._current_bucket(now)
+        old = self._index.get(key)
+        if old is not None and old is not bucket:
+            del old[key]
+        bucket[key] = value
+        self._index[key] = bucket
+        if self.max_size is not None and len(self._index) > self.max_size:
+            self._evict_oldest(len(self._index) - self.max_size)
+
+    def get(self, key, default=None):
+        bucket = self._index.get(key)
+        if bucket is None:
+            return default
+        self._expire(self._clock())
+        bucket = self._index.get(key)
+        return default if bucket is None else bucket[key]
+
+    def __getitem__(self, key):
+        marker = object()
+        value = self.get(key, marker)
+        if value is marker:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        marker = object()
+        return self.get(key, marker) is not marker
+
+    def pop(self, key, default=None):
+        bucket = self._index.pop(key, None)
+        return default if bucket is None else bucket.pop(key)
+
+    def __len__(self):
+        self._expire(self._clock())
+        return len(self._index)
+
+    def clear(self):
+        self._index.clear()
+        self._buckets.clear()
+        self._evict_order = None
+
+    # ---------- внутрішнє ----------
+
+    def _current_bucket(self, now):
+        bucket_id = int(now // self.bucket_width)
+        if not self._buckets or self._buckets[-1][0] != bucket_id:
+            self._buckets.append((bucket_id, {}))
+        return self._buckets[-1][1]
+
+    def _expire(self, now):
+        # Кошик b протерміновується, коли (b + 1) * width + ttl <= now
+        oldest_alive = (now - self.ttl) / self.bucket_width - 1
+        while self._buckets and self._buckets[0][0] <= oldest_alive:
+            _, bucket = self._buckets.popleft()
+            for key in bucket:
+                del self._index[key]
+            self.evicted += len(bucket)
+
+    def _evict_oldest(self, count):
+        # Порядок вставки найстаршого кошика знімаємо один раз у deque: next(iter(dict))
+        # після видалень з початку dict щоразу пробігає "дірки", і це O(n) на виклик.
+        while count > 0 and self._buckets:
+            bucket_id, bucket = self._buckets[0]
+            if self._evict_order is None or self._evict_order[0] != bucket_id or not self._evict_order[1]:
+                self._evict_order = (bucket_id, deque(bucket))
+            order = self._evict_order[1]
+            while count > 0 and order:
+                key = order.popleft()
+                if self._index.get(key) is bucket:   # ключ міг переїхати в новіший кошик
+                    del bucket[key]
+                    del self._index[key]
+                    count -= 1
+                    self.evicted += 1
+            if not bucket:
+                self._buckets.popleft()
+                self._evict_order = None
+
+    # ---------- облік пам'яті ----------
+
+    def memory_bytes(self) -> int:
+        """Розмір структури разом з ключами та значеннями (кожен запис рахується один раз)."""
+        total = sys.getsizeof(self._index) + sys.getsizeof(self._buckets)
+        for _, bucket in self._buckets:
+            total += sys.getsizeof(bucket)
+            total += sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in bucket.items())
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "buckets": len(self._buckets),
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+# ==========================================
+# 🔎 КЕШ РЕЗУЛЬТАТІВ ПОШУКУ
+# ==========================================
+
+class RouteSearchCache:
+    """
+    (origin, destination, date) -> впорядкований список усіх активних поїздок маршруту
+    (разом із заповненими — місце може звільнитись). Фільтр "не свої / є місця"
+    накладається на кожен запит окремо, тож один запис обслуговує всіх пасажирів.
+
+    Інвалідація точкова: invalidate_route() при створенні поїздки,
+    invalidate_trip() при будь-якій зміні місць чи статусу (trip_id -> маршрут
+    беремо з індексу). TTL лише страхує дані водія (ім'я, авто, рейтинг).
+    Викликається і з event loop, і з потоків asyncio.to_thread, тому під lock.
+    """
+
+    def __init__(self, ttl: float = 120, max_routes: int = 10_000, clock=time.monotonic):
+        self._entries = ExpiringMap(ttl=ttl, max_size=max_routes, clock=clock)
+        self._trip_routes = ExpiringMap(ttl=ttl, clock=clock)   # trip_id -> ключ маршруту
+        self._lock = threading.Lock()
+        self._generation = 0   # змінюється з кожною інвалідацією
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key: tuple, loader) -> list:
+        with self._lock:
+            trips = self._entries.get(key)
+            if trips is not None:
+                self.hits += 1
+                return trips
+            self.misses += 1
+            generation = self._generation
+
+        trips = loader(*key)   # запит до бази — поза lock
+
+        with self._lock:
+            # Якщо поки ми читали хтось писав — результат міг застаріти, не кешуємо
+            if generation == self._generation:
+                self._entries[key] = trips
+                for trip in trips:
+                    self._trip_routes[trip['id']] = key
+        return trips
+
+    def invalidate_route(self, key: tuple):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key) is not None:
+                self.invalidations += 1
+
+    def invalidate_trip(self, trip_id):
+        with self._lock:
+            self._generation += 1
+            key = self._trip_routes.pop(trip_id)
+            if key is not None and self._entries.pop(key) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._trip_routes.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "routes": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+# ==========================================
+# 👤 LRU-КЕШ ЗАПИСІВ (WRITE-THROUGH)
+# ==========================================
+
+class LRUCache:
+    """
+    Обмежений LRU "ключ -> незмінний запис" для гарячих профілів.
+    Запис потрапляє сюди при читанні з бази (get_or_load), а функції запису
+    оновлюють його на місці (update) — без повторного SELECT.
+    Як і RouteSearchCache, лічильник поколінь не дає завантаженню,
+    що перетнулось із записом, покласти в кеш старі дані.
+    """
+
+    def __init__(self, max_size: int = 50_000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+
+        value = loader(key)
+
+        with self._lock:
+            if value is not None and generation == self._generation:
+                self._data[key] = value
+                if len(self._data) > self.max_size:
+                    self._data.popitem(last=False)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._generation += 1
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def update(self, key, fn):
+        """Застосовує fn до закешованого запису (якщо він є)."""
+        with self._lock:
+            self._generation += 1
+            value = self._data.get(key)
+            if value is not None:
+                self._data[key] = fn(value)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data   # без впливу на LRU-порядок і лічильники
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "db_reads": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -7,4 +7,24 @@ DB_FILE = os.getenv("DB_PATH", "bot_database.db")
 env_admins = os.getenv("ADMIN_IDS", "")
 ADMIN_IDS = [int(id_str) for id_str in env_admins.split(",") if id_str.strip().isdigit()]
 SUPPORT_CHANNEL_ID = -1003727374942
-SENTRY_DSN = os.getenv("SENTRY_DSN")
\ No newline at end of file
+SENTRY_DSN = os.getenv("SENTRY_DSN")
+
+# 🗄 Бекапи (тільки локальний диск)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP_DAYS = int(os.getenv("BACKUP_KEEP_DAYS", "7"))
+
+# 🔭 Sentry tracing (див. tracing.py)
+SENTRY_TRACES_RATE = float(os.getenv("SENTRY_TRACES_RATE", "0.01"))      # частка звичайних апдейтів
+SENTRY_PROFILES_RATE = float(os.getenv("SENTRY_PROFILES_RATE", "0"))     # частка від відібраних транзакцій
+SENTRY_TRACE_RULES = os.getenv("SENTRY_TRACE_RULES", "")                  # "admin.*=0.2,passenger.process_search*=0.05"
+SENTRY_SLOW_UPDATE_MS = int(os.getenv("SENTRY_SLOW_UPDATE_MS", "1500"))  # повільні й з помилкою пишемо в обох режимах
+SENTRY_TAIL_SAMPLING = os.getenv("SENTRY_TAIL_SAMPLING", "0") == "1"    # "1" — спани всіх апдейтів (tail)
+
+# 📝 Логи (див. logs.py)
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_JSON = os.getenv("LOG_JSON", "0") == "1"
+LOG_UPDATE_SAMPLE_RATE = float(os.getenv("LOG_UPDATE_SAMPLE_RATE", "0.05"))  # частка рядків "Update ... is handled"
+
+# 🔎 Видача пошуку: "compact" — одна сторінка = одне повідомлення, гортається редагуванням;
+# "messages" — старий режим (заголовок + повідомлення на кожну поїздку + навігація)
+SEARCH_RESULTS_MODE = os.getenv("SEARCH_RESULTS_MODE", "compact")
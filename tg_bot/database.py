@@ -1,6 +1,15 @@
 ﻿import sqlite3
-from datetime import datetime
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta
+import pytz
 from config import DB_FILE
+from sketch import HyperLogLog
+from caches import LRUCache, RouteSearchCache
+
+logger = logging.getLogger(__name__)
 
 # ==========================================
 # 🔌 ПІДКЛЮЧЕННЯ (TUNED 🚀)
@@ -20,177 +29,100 @@ def get_connection():
     return conn
 
 def init_db():
+    """
+    Створює / оновлює схему через міграції (migrations/, див. migrate.py).
+    Для нової бази це повне створення всіх таблиць.
+    """
+    from migrate import migrate
+    migrate(DB_FILE, verbose=False)
+
+# ==========================================
+# 🧮 ЛІЧИЛЬНИКИ (МАТЕРІАЛІЗОВАНА АНАЛІТИКА)
+# ==========================================
+# Лічильники підтримують тригери з migrations/0003_stats_counters.py: кожен =
+# SUM(вираз) по всій таблиці, тому дашборд читає кілька рядків замість COUNT(*)
+# по мільйонах. Нові лічильники чи зміна виразів — окремою міграцією.
+
+def get_counters(*names):
     conn = get_connection()
-    
-    # 🔥 ГЛОБАЛЬНІ НАЛАШТУВАННЯ (Persistent)
-    conn.execute("PRAGMA journal_mode = WAL;")
-    conn.execute("PRAGMA page_size = 4096;")
-    
-    cursor = conn.cursor()
-    
-    # 1. Користувачі
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            name TEXT,
-            phone TEXT,
-            model TEXT DEFAULT '-',
-            number TEXT DEFAULT '-',
-            color TEXT DEFAULT '-',
-            rating_driver REAL DEFAULT 5.0,
-            rating_pass REAL DEFAULT 5.0,
-            trips_count INTEGER DEFAULT 0,
-            is_banned INTEGER DEFAULT 0,
-            terms_accepted INTEGER DEFAULT 0,
-            ref_source TEXT,
-            is_blocked_bot INTEGER DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            last_active DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-    
-    # 2. Поїздки
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trips (
-            id TEXT PRIMARY KEY, 
-            user_id INTEGER,
-            origin TEXT,
-            destination TEXT,
-            date TEXT,
-            time TEXT,
-            seats_total INTEGER,
-            seats_taken INTEGER DEFAULT 0,
-            price INTEGER,
-            status TEXT DEFAULT 'active',
-            description TEXT DEFAULT '' 
-        )
-    ''')
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_search ON trips(origin, destination, date, status)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_user ON trips(user_id)")
-
-    # 3. Бронювання
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            trip_id TEXT,
-            passenger_id INTEGER,
-            status TEXT DEFAULT 'active',
-            reminded INTEGER DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_pass ON bookings(passenger_id, status)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_trip ON bookings(trip_id)")
-
-    # 4. Історія повідомлень
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sender_id INTEGER,
-            receiver_id INTEGER,
-            message TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            is_read INTEGER DEFAULT 0
-        )
-    ''')
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_pair ON chat_history(sender_id, receiver_id)")
-
-    # 5. Активні сесії чатів
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS active_chats (
-            user_id INTEGER PRIMARY KEY,
-            partner_id INTEGER
-        )
-    ''')
+    marks = ", ".join("?" * len(names))
+    rows = conn.execute(f"SELECT name, value FROM stats_counters WHERE name IN ({marks})", names).fetchall()
+    conn.close()
+    values = dict.fromkeys(names, 0)
+    values.update({r['name']: r['value'] for r in rows})
+    return values
 
-    # 6. Очистка інтерфейсу
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS interface_cleanup (
-            user_id INTEGER,
-            message_id INTEGER
-        )
-    ''')
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cleanup_user ON interface_cleanup(user_id)")
-
-    # 7. Інші таблиці
-    cursor.execute('CREATE TABLE IF NOT EXISTS cities (name TEXT PRIMARY KEY, search_count INTEGER DEFAULT 1)')
-    cursor.execute('CREATE TABLE IF NOT EXISTS search_history (user_id INTEGER, origin TEXT, destination TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
-    cursor.execute('CREATE TABLE IF NOT EXISTS subscriptions (user_id INTEGER, origin TEXT, destination TEXT, date TEXT)')
-    cursor.execute('CREATE TABLE IF NOT EXISTS ratings (id INTEGER PRIMARY KEY AUTOINCREMENT, from_user_id INTEGER, to_user_id INTEGER, trip_id TEXT, role TEXT, score INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
-
-    # 8. Лог скасувань (Анти-скрапінг)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cancellation_logs (
-            user_id INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
+# ==========================================
+# 👥 DAU / WAU / MAU (СКЕТЧІ)
+# ==========================================
+
+SKETCH_RETENTION_DAYS = 365
+
+def merge_activity_sketches(sketches):
+    """sketches: {'YYYY-MM-DD': HyperLogLog} — зливає з тим, що вже лежить у базі."""
+    if not sketches: return
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for day, sketch in sketches.items():
+            row = conn.execute("SELECT registers FROM activity_sketches WHERE day = ?", (day,)).fetchone()
+            merged = HyperLogLog(sketch.p, bytes(sketch))
+            if row: merged.merge(HyperLogLog(sketch.p, row[0]))
+            conn.execute("INSERT OR REPLACE INTO activity_sketches (day, registers) VALUES (?, ?)", (day, bytes(merged)))
+        conn.execute("DELETE FROM activity_sketches WHERE day < date('now', ?)", (f"-{SKETCH_RETENTION_DAYS} days",))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_unique_active_users(days=1):
+    """Унікальні активні за останні days календарних днів (UTC), включно з сьогодні."""
+    conn = get_connection()
+    rows = conn.execute("SELECT registers FROM activity_sketches WHERE day > date('now', ?)", (f"-{days} days",)).fetchall()
     conn.close()
+    return HyperLogLog.merged(r[0] for r in rows).count()
+
+def get_daily_counter(name, day=None):
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM stats_daily WHERE day = COALESCE(?, date('now')) AND name = ?", (day, name)).fetchone()
+    conn.close()
+    return row[0] if row else 0
 
 # ==========================================
 # 📊 АНАЛІТИКА
 # ==========================================
 
 def get_stats_general():
-    conn = get_connection()
-    active = conn.execute("SELECT COUNT(*) FROM trips WHERE status='active'").fetchone()[0]
-    finished = conn.execute("SELECT COUNT(*) FROM trips WHERE status='finished'").fetchone()[0]
-    bookings = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
-    conn.close()
-    return {'active_trips': active, 'finished_trips': finished, 'total_bookings': bookings}
+    c = get_counters("trips_active", "trips_finished", "bookings_total")
+    return {'active_trips': c['trips_active'], 'finished_trips': c['trips_finished'], 'total_bookings': c['bookings_total']}
 
 def get_stats_extended():
-    conn = get_connection()
-    total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-    blocked = conn.execute("SELECT COUNT(*) FROM users WHERE is_blocked_bot=1").fetchone()[0]
-    new_today = conn.execute("SELECT COUNT(*) FROM users WHERE date(created_at) = date('now')").fetchone()[0]
-    
-    drivers = conn.execute("SELECT COUNT(*) FROM users WHERE model != '-'").fetchone()[0]
+    c = get_counters("users_total", "users_blocked", "users_drivers")
+    total = c['users_total']
+    new_today = get_daily_counter("users_new")
+
+    drivers = c['users_drivers']
     passengers = total - drivers
 
-    dau = conn.execute('''
-        SELECT COUNT(DISTINCT user_id) FROM (
-            SELECT user_id FROM search_history WHERE timestamp > datetime('now', '-1 day')
-            UNION
-            SELECT passenger_id as user_id FROM bookings WHERE created_at > datetime('now', '-1 day')
-        )
-    ''').fetchone()[0]
-    
-    mau = conn.execute('''
-        SELECT COUNT(DISTINCT user_id) FROM (
-            SELECT user_id FROM search_history WHERE timestamp > datetime('now', '-30 days')
-            UNION
-            SELECT passenger_id as user_id FROM bookings WHERE created_at > datetime('now', '-30 days')
-        )
-    ''').fetchone()[0]
+    dau = get_unique_active_users(1)
+    wau = get_unique_active_users(7)
+    mau = get_unique_active_users(30)
     if mau == 0: mau = 1 
 
-    conn.close()
     return {
-        'total_users': total, 'blocked': blocked, 'new_today': new_today, 
-        'dau': dau, 'mau': mau, 
+        'total_users': total, 'blocked': c['users_blocked'], 'new_today': new_today, 
+        'dau': dau, 'wau': wau, 'mau': mau, 
         'drivers': drivers, 'passengers': passengers
     }
 
 def get_financial_stats():
-    conn = get_connection()
-    gmv = conn.execute("SELECT SUM(price * seats_taken) FROM trips WHERE status='finished'").fetchone()[0]
-    conn.close()
-    return gmv if gmv else 0
+    return get_counters("gmv_finished")["gmv_finished"]
 
 def get_efficiency_stats():
-    conn = get_connection()
-    avg_price = conn.execute("SELECT AVG(price) FROM trips WHERE status='active'").fetchone()[0]
-    occupancy_data = conn.execute("SELECT SUM(seats_taken), SUM(seats_total) FROM trips WHERE status IN ('active', 'finished')").fetchone()
-    conn.close()
+    c = get_counters("active_price_sum", "active_priced", "seats_taken_used", "seats_total_used")
+    avg_price = c['active_price_sum'] / c['active_priced'] if c['active_priced'] else 0
     
-    taken = occupancy_data[0] if occupancy_data and occupancy_data[0] else 0
-    total = occupancy_data[1] if occupancy_data and occupancy_data[1] else 1
+    taken = c['seats_taken_used']
+    total = c['seats_total_used'] or 1
     
     occupancy_rate = round((taken / total) * 100, 1) if total > 0 else 0
     avg_price = round(avg_price, 0) if avg_price else 0
@@ -203,11 +135,18 @@ def get_top_sources():
     conn.close()
     return [(r['ref_source'], r['cnt']) for r in rows]
 
-def get_conversion_rate():
+def get_conversion_rate(days=30):
+    """Бронювання / пошуки за однаковий період, з журналу подій."""
     conn = get_connection()
-    searches = conn.execute("SELECT COUNT(*) FROM search_history").fetchone()[0]
-    bookings = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
-    conn.close()
+    rows = conn.execute('''
+        SELECT event, COUNT(*) FROM events
+        WHERE event IN ('search_success', 'search_empty', 'booking_success') AND ts > datetime('now', ?)
+        GROUP BY event
+    ''', (f"-{days} days",)).fetchall()
+    conn.close()
+    counts = dict(rows)
+    searches = counts.get('search_success', 0) + counts.get('search_empty', 0)
+    bookings = counts.get('booking_success', 0)
     if searches == 0: return 0
     return round((bookings / searches) * 100, 1)
 
@@ -217,9 +156,37 @@ def get_peak_hours():
     conn.close()
     return [dict(r) for r in rows]
 
-def get_top_failed_searches():
+def get_top_failed_searches(days=30):
     conn = get_connection()
-    rows = conn.execute("SELECT origin || ' - ' || destination as event_data, COUNT(*) as cnt FROM search_history GROUP BY origin, destination ORDER BY cnt DESC LIMIT 3").fetchall()
+    rows = conn.execute('''
+        SELECT origin || ' - ' || destination as event_data, SUM(empty) as cnt FROM search_demand
+        WHERE date > date('now', ?)
+        GROUP BY origin, destination HAVING cnt > 0 ORDER BY cnt DESC LIMIT 3
+    ''', (f"-{days} days",)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def get_unmet_demand(limit=3, days_ahead=3):
+    """
+    Маршрути на найближчі дні, де пасажири шукали і нічого не знайшли,
+    а вільних місць досі немає. Дата в рядку — ISO (YYYY-MM-DD).
+    """
+    today = datetime.now(pytz.timezone('Europe/Kyiv')).strftime("%Y-%m-%d")
+    conn = get_connection()
+    rows = conn.execute('''
+        SELECT d.origin, d.destination, d.date, SUM(d.searches) as searches, SUM(d.empty) as empty
+        FROM search_demand d
+        WHERE d.date BETWEEN ? AND date(?, ?)
+          AND NOT EXISTS (
+              SELECT 1 FROM trips t
+              WHERE t.origin = d.origin AND t.destination = d.destination
+                AND t.date = strftime('%d.%m', d.date) AND t.status = 'active'
+                AND t.seats_taken < t.seats_total
+          )
+        GROUP BY d.origin, d.destination, d.date
+        HAVING empty > 0
+        ORDER BY empty DESC, searches DESC LIMIT ?
+    ''', (today, today, f"+{days_ahead} days", limit)).fetchall()
     conn.close()
     return [dict(r) for r in rows]
 
@@ -233,72 +200,162 @@ def get_top_routes(limit=3):
 # 👤 КОРИСТУВАЧІ
 # ==========================================
 
+@dataclass(frozen=True, slots=True)
+class UserRecord:
+    """
+    Профіль з таблиці users без last_active (він міняється на кожен апдейт).
+    Підтримує user['name'] і user.get('username'), як колишній dict.
+    """
+    user_id: int
+    username: str
+    name: str
+    phone: str
+    model: str = '-'
+    number: str = '-'
+    color: str = '-'
+    rating_driver: float = 5.0
+    rating_pass: float = 5.0
+    trips_count: int = 0
+    is_banned: int = 0
+    terms_accepted: int = 0
+    ref_source: str = None
+    is_blocked_bot: int = 0
+    created_at: str = None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+USER_COLUMNS = tuple(f.name for f in fields(UserRecord))
+
+# user_id -> UserRecord. Функції запису нижче оновлюють запис у кеші (write-through):
+# save_user, accept_terms, set_user_blocked_bot,
+# ban_user_by_id, add_rating; save_users_batch і адмінка — через user_cache.invalidate / cache_user_update.
+USER_CACHE_SIZE = 50_000
+user_cache = LRUCache(max_size=USER_CACHE_SIZE)
+
+def _load_user(user_id):
+    conn = get_connection()
+    row = conn.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    conn.close()
+    return UserRecord(*row) if row else None
+
+def cache_user_update(user_id, **changes):
+    """Переносить уже записані в базу зміни на закешований профіль (якщо він є)."""
+    user_cache.update(user_id, lambda user: replace(user, **changes))
+
 def get_user(user_id):
-    conn = get_connection()
-    user = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
-    return dict(user) if user else None
+    return user_cache.get_or_load(user_id, _load_user)
+
+# Забанені та ті, хто заблокував бота, — у пам'яті: BanMiddleware і розсилка
+# не читають ці прапорці з бази. Завантажуються при старті (load_user_flags),
+# далі їх підтримують ban_user_by_id, set_user_blocked_bot і адмінські хелпери.
+banned_users = set()
+blocked_users = set()
+
+def load_user_flags():
+    conn = get_connection()
+    rows = conn.execute("SELECT user_id, is_banned, is_blocked_bot FROM users WHERE is_banned = 1 OR is_blocked_bot = 1").fetchall()
+    conn.close()
+    banned_users.clear()
+    blocked_users.clear()
+    banned_users.update(r['user_id'] for r in rows if r['is_banned'])
+    blocked_users.update(r['user_id'] for r in rows if r['is_blocked_bot'])
+    return len(banned_users), len(blocked_users)
+
+# Один upsert і для нового юзера, і для часткового оновлення профілю:
+# NULL у параметрі = "не змінювати" (COALESCE), для нового рядка — значення за замовчуванням.
+_SAVE_USER_SQL = '''
+    INSERT INTO users (user_id, username, name, phone, model, number, color, ref_source, created_at, last_active)
+    VALUES (:user_id, :username, COALESCE(:name, 'Користувач'), COALESCE(:phone, '-'),
+            COALESCE(:model, '-'), COALESCE(:number, '-'), COALESCE(:color, '-'), :ref_source,
+            CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT(user_id) DO UPDATE SET
+        last_active = CURRENT_TIMESTAMP,
+        name = COALESCE(:name, name),
+        username = COALESCE(:username, username),
+        phone = COALESCE(:phone, phone),
+        model = COALESCE(:model, model),
+        number = COALESCE(:number, number),
+        color = COALESCE(:color, color),
+        ref_source = COALESCE(ref_source, :ref_source)
+'''
+
+def _save_user_params(user_id, name, username, phone=None, model='-', number='-', color='-', ref_source=None):
+    # Порожні рядки та '-' у полях авто, як і раніше, не перетирають збережене
+    return {
+        "user_id": user_id, "name": name or None, "username": username or None, "phone": phone or None,
+        "model": None if model == '-' else model, "number": None if number == '-' else number,
+        "color": None if color == '-' else color, "ref_source": ref_source or None,
+    }
 
 def save_user(user_id, name, username, phone=None, model='-', number='-', color='-', ref_source=None):
+    """Створює або частково оновлює профіль за один запит; RETURNING одразу кладе його в кеш."""
     conn = get_connection()
-    if get_user(user_id):
-        updates = ["last_active=CURRENT_TIMESTAMP"]
-        params = []
-        if name:
-            updates.append("name=?")
-            params.append(name)
-        if username:
-            updates.append("username=?")
-            params.append(username)
-        if phone: 
-            updates.append("phone=?")
-            params.append(phone)
-        if model != '-': 
-            updates.append("model=?")
-            params.append(model)
-        if number != '-': 
-            updates.append("number=?")
-            params.append(number)
-        if color != '-': 
-            updates.append("color=?")
-            params.append(color)
-        if ref_source:
-             updates.append("ref_source = COALESCE(ref_source, ?)")
-             params.append(ref_source)
-        params.append(user_id)
-        
-        if updates:
-            conn.execute(f"UPDATE users SET {', '.join(updates)} WHERE user_id=?", params)
-    else:
-        conn.execute('''
-            INSERT INTO users (user_id, username, name, phone, ref_source, created_at, last_active) 
-            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ''', (user_id, username, name if name else "Користувач", phone if phone else '-', ref_source))
+    row = conn.execute(f"{_SAVE_USER_SQL} RETURNING {', '.join(USER_COLUMNS)}",
+                       _save_user_params(user_id, name, username, phone, model, number, color, ref_source)).fetchone()
     conn.commit()
     conn.close()
+    user = UserRecord(*row)
+    user_cache.put(user_id, user)
+    return user
 
-def update_user_activity(user_id, username, name):
+def save_users_batch(rows):
+    """
+    Імпорт пачкою: rows — словники з аргументами save_user (user_id, name, username,
+    необов'язково phone/model/number/color/ref_source). Одна транзакція на всю пачку.
+    """
+    if not rows: return 0
+    params = [_save_user_params(**row) for row in rows]
     conn = get_connection()
-    conn.execute('''
-        INSERT INTO users (user_id, username, name, phone) 
-        VALUES (?, ?, ?, '-')
-        ON CONFLICT(user_id) DO UPDATE SET 
-            last_active = CURRENT_TIMESTAMP,
-            username = excluded.username,
-            name = excluded.name
-    ''', (user_id, username, name))
+    with conn:
+        conn.executemany(_SAVE_USER_SQL, params)
+    conn.close()
+    user_cache.invalidate(*(p["user_id"] for p in params))
+    return len(params)
+
+def ensure_user(user_id, username, name):
+    """
+    Рядок для юзера, якого ще немає в базі (перший апдейт може бути не /start).
+    Існуючий профіль не чіпає: ім'я, яке юзер зберіг сам, не перетирається даними Telegram.
+    """
+    if get_user(user_id) is not None:
+        return False
+    conn = get_connection()
+    cur = conn.execute('''
+        INSERT INTO users (user_id, username, name, phone, created_at, last_active)
+        VALUES (?, ?, ?, '-', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO NOTHING
+    ''', (user_id, username, name or "Користувач"))
     conn.commit()
     conn.close()
+    return cur.rowcount == 1
+
+def update_users_activity_batch(rows):
+    """rows: [(user_id, last_active), ...] — лише last_active, одна транзакція на всю пачку."""
+    if not rows: return 0
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE users SET last_active = ? WHERE user_id = ?", [(ts, uid) for uid, ts in rows])
+    conn.close()
+    return len(rows)
 
 def is_user_banned(user_id):
-    user = get_user(user_id)
-    return user['is_banned'] == 1 if user else False
+    return user_id in banned_users
 
 def set_user_blocked_bot(user_id, is_blocked):
     conn = get_connection()
     conn.execute("UPDATE users SET is_blocked_bot = ? WHERE user_id = ?", (1 if is_blocked else 0, user_id))
     conn.commit()
     conn.close()
+    cache_user_update(user_id, is_blocked_bot=1 if is_blocked else 0)
+    if is_blocked: blocked_users.add(user_id)
+    else: blocked_users.discard(user_id)
 
 def check_terms_status(user_id):
     user = get_user(user_id)
@@ -309,6 +366,7 @@ def accept_terms(user_id, full_name):
     conn.execute("UPDATE users SET terms_accepted = 1, name = ? WHERE user_id = ?", (full_name, user_id))
     conn.commit()
     conn.close()
+    cache_user_update(user_id, terms_accepted=1, name=full_name)
 
 # ==========================================
 # 💬 ЧАТ
@@ -392,10 +450,20 @@ def get_all_cities_names():
 def get_city_suggestion(text):
     return None
 
-def log_event(user_id, event, details):
-    print(f"📊 LOG: {user_id} | {event} | {details}")
-    if event == "search_success" or event == "search_empty":
-        update_user_activity(user_id, None, None)
+# ==========================================
+# 📊 ЖУРНАЛ ПОДІЙ
+# ==========================================
+
+EVENTS_RETENTION_DAYS = 365
+
+def insert_events(rows):
+    """rows: [(ts, user_id, event, origin, destination, trip_id, value, trip_date), ...]"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO events (ts, user_id, event, origin, destination, trip_id, value, trip_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    conn.close()
 
 # ==========================================
 # 🚗 ПОЇЗДКИ (ДІЇ)
@@ -409,6 +477,7 @@ def save_trip(trip_id, user_id, origin, destination, date, time, seats, price, d
     )
     conn.commit()
     conn.close()
+    search_cache.invalidate_route((origin, destination, date))
     return trip_id
 
 def create_trip(*args, **kwargs):
@@ -443,6 +512,7 @@ def finish_trip(trip_id):
     conn.execute("UPDATE trips SET status = 'finished' WHERE id = ?", (trip_id,))
     conn.commit()
     conn.close()
+    search_cache.invalidate_trip(trip_id)
 
 def delete_trip(trip_id):
     conn = get_connection()
@@ -452,6 +522,7 @@ def delete_trip(trip_id):
     conn.execute("UPDATE bookings SET status = 'cancelled' WHERE trip_id = ?", (trip_id,))
     conn.commit()
     conn.close()
+    search_cache.invalidate_trip(trip_id)
     
     return [p['passenger_id'] for p in passengers]
 
@@ -470,27 +541,29 @@ def search_trips(origin, destination, date, viewer_id):
     trips, _ = search_trips_page(origin, destination, date, viewer_id, 100, 0)
     return trips
 
-def search_trips_page(origin, destination, date, viewer_id, limit, offset):
+# Маршрут -> усі активні поїздки (див. caches.RouteSearchCache). Інвалідують:
+# save_trip, add_booking, delete_booking, kick_passenger, finish_trip,
+# mark_trip_finished, delete_trip; ban_user_by_id скидає кеш повністю.
+SEARCH_CACHE_TTL = 120
+search_cache = RouteSearchCache(ttl=SEARCH_CACHE_TTL)
+
+def _load_route_trips(origin, destination, date):
     conn = get_connection()
     rows = conn.execute('''
         SELECT t.*, u.name as driver_name, u.rating_driver, u.model, u.color, u.user_id
         FROM trips t
         JOIN users u ON t.user_id = u.user_id
         WHERE t.origin = ? AND t.destination = ? AND t.date = ? AND t.status = 'active'
-          AND t.seats_taken < t.seats_total AND t.user_id != ?
         ORDER BY t.time ASC
-        LIMIT ? OFFSET ?
-    ''', (origin, destination, date, viewer_id, limit, offset)).fetchall()
-    
-    count = conn.execute('''
-        SELECT COUNT(*)
-        FROM trips t
-        WHERE t.origin = ? AND t.destination = ? AND t.date = ? AND t.status = 'active'
-          AND t.seats_taken < t.seats_total AND t.user_id != ?
-    ''', (origin, destination, date, viewer_id)).fetchone()[0]
-    
+    ''', (origin, destination, date)).fetchall()
     conn.close()
-    return [dict(row) for row in rows], count
+    return tuple(dict(row) for row in rows)
+
+def search_trips_page(origin, destination, date, viewer_id, limit, offset):
+    trips = search_cache.get_or_load((origin, destination, date), _load_route_trips)
+    visible = [t for t in trips if t['seats_taken'] < t['seats_total'] and t['user_id'] != viewer_id]
+    # Копії, щоб хендлер випадково не змінив закешований рядок
+    return [dict(t) for t in visible[offset:offset + limit]], len(visible)
 
 def get_trip_details(trip_id):
     conn = get_connection()
@@ -561,6 +634,7 @@ def add_booking(trip_id, passenger_id):
             
         conn.execute("INSERT INTO bookings (trip_id, passenger_id) VALUES (?, ?)", (trip_id, passenger_id))
         conn.commit()
+        search_cache.invalidate_trip(trip_id)
         return True, "Success"
         
     except sqlite3.Error as e:
@@ -621,7 +695,7 @@ def delete_booking(booking_id, passenger_id):
         
         # Отримуємо дані для сповіщення перед видаленням
         trip_info = conn.execute("""
-            SELECT t.user_id as driver_id, u.name as passenger_name 
+            SELECT t.id as trip_id, t.user_id as driver_id, u.name as passenger_name 
             FROM trips t, users u 
             WHERE t.id = ? AND u.user_id = ?
         """, (trip_id, passenger_id)).fetchone()
@@ -630,9 +704,10 @@ def delete_booking(booking_id, passenger_id):
         conn.execute("UPDATE trips SET seats_taken = seats_taken - 1 WHERE id = ?", (trip_id,))
         
         conn.commit()
+        search_cache.invalidate_trip(trip_id)
         return dict(trip_info) if trip_info else {}
     except Exception as e:
-        print(f"❌ DB Error delete_booking: {e}")
+        logger.error(f"❌ DB Error delete_booking: {e}")
         conn.rollback()
         return None
     finally:
@@ -662,9 +737,10 @@ def kick_passenger(booking_id, driver_id):
         conn.execute("UPDATE trips SET seats_taken = seats_taken - 1 WHERE id = ?", (booking['trip_id'],))
         
         conn.commit()
+        search_cache.invalidate_trip(booking['trip_id'])
         return dict(booking)
     except Exception as e:
-        print(f"❌ DB Error kick_passenger: {e}")
+        logger.error(f"❌ DB Error kick_passenger: {e}")
         conn.rollback()
         return None
     finally:
@@ -682,6 +758,7 @@ def add_rating(from_id, to_id, trip_id, role, score):
     conn.execute(f"UPDATE users SET {col} = ? WHERE user_id = ?", (avg, to_id))
     conn.commit()
     conn.close()
+    cache_user_update(to_id, **{col: avg})
 
 def get_user_rating(user_id, role="driver"):
     conn = get_connection()
@@ -708,24 +785,32 @@ def get_subscribers_for_trip(origin, dest, date):
     conn.close()
     return [row['user_id'] for row in rows]
 
+# Останні пошуки: фіксовані слоти (user_id, slot) у recent_searches, WITHOUT ROWID.
+# Повтор маршруту оновлює свій слот, новий займає вільний або найстаріший —
+# і запис, і читання торкаються лише RECENT_SEARCHES_SLOTS рядків юзера.
+# Аналітика пошуків живе окремо, у журналі подій (events.py).
+RECENT_SEARCHES_SLOTS = 5
+
 def save_search_history(user_id, origin, destination):
     conn = get_connection()
-    conn.execute("DELETE FROM search_history WHERE user_id = ? AND origin = ? AND destination = ?", (user_id, origin, destination))
-    conn.execute("INSERT INTO search_history (user_id, origin, destination) VALUES (?, ?, ?)", (user_id, origin, destination))
-    conn.execute("DELETE FROM search_history WHERE rowid NOT IN (SELECT rowid FROM search_history WHERE user_id = ? ORDER BY rowid DESC LIMIT 5) AND user_id = ?", (user_id, user_id))
+    conn.execute('''
+        INSERT INTO recent_searches (user_id, slot, origin, destination, ts)
+        VALUES (:user_id, COALESCE(
+            (SELECT slot FROM recent_searches WHERE user_id = :user_id AND origin = :origin AND destination = :destination),
+            (SELECT CASE WHEN COUNT(*) < :slots THEN COUNT(*) END FROM recent_searches WHERE user_id = :user_id),
+            (SELECT slot FROM recent_searches WHERE user_id = :user_id ORDER BY ts LIMIT 1)
+        ), :origin, :destination, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        ON CONFLICT(user_id, slot) DO UPDATE SET
+            origin = excluded.origin, destination = excluded.destination, ts = excluded.ts
+    ''', {"user_id": user_id, "origin": origin, "destination": destination, "slots": RECENT_SEARCHES_SLOTS})
     conn.commit()
     conn.close()
 
 def get_recent_searches(user_id):
     conn = get_connection()
-    rows = conn.execute('''
-        SELECT origin, destination 
-        FROM search_history 
-        WHERE user_id = ? 
-        GROUP BY origin, destination 
-        ORDER BY MAX(timestamp) DESC 
-        LIMIT 5
-    ''', (user_id,)).fetchall()
+    rows = conn.execute(
+        "SELECT origin, destination FROM recent_searches WHERE user_id = ? ORDER BY ts DESC", (user_id,)
+    ).fetchall()
     conn.close()
     return [(row['origin'], row['destination']) for row in rows]
 
@@ -745,23 +830,112 @@ def mark_trip_finished(trip_id):
     conn.execute("UPDATE trips SET status='finished' WHERE id=?", (trip_id,))
     conn.commit()
     conn.close()
+    search_cache.invalidate_trip(trip_id)
+
+# Очистка йде пачками: id застарілих рядків читаються без блокування (WAL),
+# а видаляються короткими транзакціями по CLEANUP_BATCH рядків з паузою між ними,
+# тож бронювання і пошуки бота не чекають на одну велику транзакцію.
+# Умова повторюється і в DELETE — рядок, що встиг змінитись, не зачепимо.
+CLEANUP_BATCH = 1000
+CLEANUP_PAUSE = 0.05          # сек між транзакціями
+VACUUM_STEP_PAGES = 500       # incremental_vacuum за одну транзакцію
+VACUUM_MAX_PAGES = 25_000     # ~100 MB за прогін, решта — наступного разу
+TRIP_RETENTION_DAYS = 60
+TRIP_DATES_AHEAD = 7          # kb_dates дає дати лише на кілька днів уперед
+
+def _expired_trip_dates():
+    """
+    trips.date — 'dd.mm' без року, тож порівнювати його з датою не можна.
+    Замість цього — перелік 'dd.mm' днів, старших за TRIP_RETENTION_DAYS, аж до
+    року назад мінус TRIP_DATES_AHEAD: такі ж 'dd.mm' у майбутньому поїздка мати не може.
+    Умова status IN (...) AND date IN (...) йде по індексу idx_trips_status_date.
+    """
+    today = datetime.now(pytz.timezone('Europe/Kyiv')).date()
+    return tuple((today - timedelta(days=d)).strftime("%d.%m")
+                 for d in range(TRIP_RETENTION_DAYS + 1, 365 - TRIP_DATES_AHEAD))
+
+def _cleanup_rules():
+    """(таблиця, умова, параметри, залежна таблиця з FK на неї або None)"""
+    trip_dates = _expired_trip_dates()
+    return (
+        ("chat_history", "timestamp < datetime('now', '-7 days')", (), None),
+        ("trips", f"status IN ('finished', 'cancelled') AND date IN ({','.join('?' * len(trip_dates))})", trip_dates,
+         ("bookings", "trip_id", "id")),
+        ("bookings", "trip_id NOT IN (SELECT id FROM trips)", (), None),   # сироти зі старих версій
+        ("events", "ts < datetime('now', ?)", (f"-{EVENTS_RETENTION_DAYS} days",), None),
+        ("action_log", "ts < ?", (time.time() - ACTION_LOG_RETENTION,), None),
+    )
+
+def _write_batch(conn, report, statements):
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rowcounts = []
+        for sql, params in statements:
+            cur = conn.execute(sql, params)
+            cur.fetchall()   # PRAGMA incremental_vacuum звільняє по сторінці на кожен крок курсора
+            rowcounts.append(cur.rowcount)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    lock_ms = (time.perf_counter() - started) * 1000
+    report["batches"] += 1
+    report["lock_ms"] += lock_ms
+    report["max_lock_ms"] = max(report["max_lock_ms"], lock_ms)
+    return rowcounts
+
+def _delete_in_batches(conn, report, table, where, params, child):
+    while True:
+        ids = [r[0] for r in conn.execute(f"SELECT rowid FROM {table} WHERE {where} LIMIT ?", (*params, CLEANUP_BATCH))]
+        if not ids: return
+        marks = ",".join("?" * len(ids))
+        statements = []
+        if child:
+            child_table, fk, key = child
+            statements.append((f"DELETE FROM {child_table} WHERE {fk} IN "
+                               f"(SELECT {key} FROM {table} WHERE rowid IN ({marks}) AND {where})", (*ids, *params)))
+        statements.append((f"DELETE FROM {table} WHERE rowid IN ({marks}) AND {where}", (*ids, *params)))
+        counts = _write_batch(conn, report, statements)
+        if child:
+            report["deleted"][child[0]] += counts[0]
+        report["deleted"][table] += counts[-1]
+        if len(ids) < CLEANUP_BATCH: return
+        time.sleep(CLEANUP_PAUSE)
+
+def _incremental_vacuum(conn, report):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:   # 2 = INCREMENTAL, див. міграцію 0008
+        return
+    pages = min(conn.execute("PRAGMA freelist_count").fetchone()[0], VACUUM_MAX_PAGES)
+    while pages > 0:
+        step = min(pages, VACUUM_STEP_PAGES)
+        _write_batch(conn, report, [(f"PRAGMA incremental_vacuum({step})", ())])
+        report["vacuum_pages"] += step
+        pages -= step
+        if pages: time.sleep(CLEANUP_PAUSE)
 
 def perform_db_cleanup():
+    """
+    Видаляє застарілі дані пачками і повертає звіт:
+    {"deleted": {таблиця: рядків}, "batches", "lock_ms", "max_lock_ms", "vacuum_pages", "elapsed_ms"}.
+    """
+    report = {"deleted": Counter(), "batches": 0, "lock_ms": 0.0, "max_lock_ms": 0.0, "vacuum_pages": 0}
+    started = time.perf_counter()
     conn = get_connection()
     try:
-        conn.execute("DELETE FROM chat_history WHERE timestamp < datetime('now', '-7 days')")
-        conn.execute("DELETE FROM trips WHERE status IN ('finished', 'cancelled') AND date < date('now', '-60 days')")
-        conn.execute("DELETE FROM search_history WHERE timestamp < datetime('now', '-2 days')")
-        conn.execute("DELETE FROM bookings WHERE trip_id NOT IN (SELECT id FROM trips)")
-        
-        # 🔥 FIX: Замість блокуючого TRUNCATE використовуємо безпечний OPTIMIZE
+        for table, where, params, child in _cleanup_rules():
+            _delete_in_batches(conn, report, table, where, params, child)
+        _incremental_vacuum(conn, report)
         conn.execute("PRAGMA optimize;")
-        
-        conn.commit()
     except Exception as e:
-        print(f"Cleanup Error: {e}")
+        logger.error(f"Cleanup Error: {e}")
     finally:
         conn.close()
+    report["deleted"] = dict(report["deleted"])
+    report["lock_ms"] = round(report["lock_ms"], 1)
+    report["max_lock_ms"] = round(report["max_lock_ms"], 1)
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
 
 def ban_user_by_id(user_id, reason="Admin Ban"):
     conn = get_connection()
@@ -770,26 +944,38 @@ def ban_user_by_id(user_id, reason="Admin Ban"):
     conn.execute("UPDATE bookings SET status = 'cancelled' WHERE passenger_id = ? AND status = 'active'", (user_id,))
     conn.commit()
     conn.close()
+    cache_user_update(user_id, is_banned=1)
+    banned_users.add(user_id)
+    search_cache.clear()   # поїздки юзера могли бути в будь-якому маршруті
+
+# ==========================================
+# 🚦 ЖУРНАЛ ДІЙ ДЛЯ ЛІМІТІВ (limits.py)
+# ==========================================
+# action_log: (user_id, action, ts) з індексом саме під це — і підрахунок у вікні,
+# і видалення прострочених записів торкаються лише рядків одного юзера й дії.
+# Записи юзерів, які більше не повертались, прибирає perform_db_cleanup.
+ACTION_LOG_RETENTION = 7 * 86400   # сек; вікно будь-якого ліміту не довше
 
-def log_cancellation_event(user_id):
+def count_actions(user_id, action, since):
     conn = get_connection()
-    conn.execute("INSERT INTO cancellation_logs (user_id) VALUES (?)", (user_id,))
-    conn.execute("DELETE FROM cancellation_logs WHERE timestamp < datetime('now', '-1 day')")
+    count = conn.execute(
+        "SELECT COUNT(*) FROM action_log WHERE user_id = ? AND action = ? AND ts > ?", (user_id, action, since)
+    ).fetchone()[0]
+    conn.close()
+    return count
+
+def log_action(user_id, action, ts, expired_before):
+    conn = get_connection()
+    conn.execute("DELETE FROM action_log WHERE user_id = ? AND action = ? AND ts <= ?", (user_id, action, expired_before))
+    conn.execute("INSERT INTO action_log (user_id, action, ts) VALUES (?, ?, ?)", (user_id, action, ts))
     conn.commit()
     conn.close()
 
-def can_user_book(user_id):
+def count_driver_active_trips(user_id):
     conn = get_connection()
-    count = conn.execute(
-        "SELECT COUNT(*) FROM cancellation_logs WHERE user_id = ? AND timestamp > datetime('now', '-1 day')", 
-        (user_id,)
-    ).fetchone()[0]
+    count = conn.execute("SELECT COUNT(*) FROM trips WHERE user_id = ? AND status = 'active'", (user_id,)).fetchone()[0]
     conn.close()
-    
-    if count >= 3:
-        return False, "🚫 <b>Блокування на 24 години!</b>\nВи занадто часто скасовували бронювання."
-    
-    return True, ""
+    return count
 
 def get_bookings_to_remind():
     conn = get_connection()
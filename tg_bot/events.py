@@ -0,0 +1,92 @@
+﻿import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+import pytz
+
+from database import insert_events
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 📊 ЖУРНАЛ ПОДІЙ (ВОРОНКА)
+# ==========================================
+# Подія -> обов'язкові поля. Все пишеться в append-only таблицю events:
+# (ts, user_id, event, origin, destination, trip_id, value, trip_date)
+# trip_date — дата поїздки в ISO (YYYY-MM-DD), див. trip_date_iso()
+
+EVENT_SCHEMA = {
+    "search_success":    ("origin", "destination", "trip_date", "value"),  # value = скільки поїздок знайдено
+    "search_empty":      ("origin", "destination", "trip_date"),
+    "booking_success":   ("trip_id",),
+    "booking_cancelled": ("trip_id",),
+    "passenger_kicked":  ("trip_id",),
+    "trip_created":      ("trip_id", "origin", "destination", "trip_date", "value"),  # value = кількість місць
+    "trip_cancelled":    ("trip_id", "value"),                            # value = скільки пасажирів зачепило
+}
+
+
+class EventLog:
+    """
+    Кільцевий буфер подій у пам'яті + пакетний запис у базу раз на interval секунд.
+    Якщо база не встигає, найстаріші події витісняються (лічильник dropped).
+    """
+
+    def __init__(self, interval: float = 10, capacity: int = 50_000):
+        self.interval = interval
+        self._buffer = deque(maxlen=capacity)
+        self.dropped = 0
+        self.written = 0
+
+    def log(self, user_id: int, event: str, origin=None, destination=None, trip_id=None, value=None, trip_date=None):
+        fields = {"origin": origin, "destination": destination, "trip_id": trip_id, "value": value, "trip_date": trip_date}
+        missing = [f for f in EVENT_SCHEMA.get(event, ()) if fields[f] is None]
+        if event not in EVENT_SCHEMA or missing:
+            logger.warning(f"⚠️ Event {event!r} поза схемою або без полів {missing}")
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        logger.info(f"📊 EVENT: {user_id} | {event} | {origin or ''}->{destination or ''} {trip_id or ''} {value if value is not None else ''}")
+        self._buffer.append((ts, user_id, event, origin, destination, trip_id, value, trip_date))
+
+    def __len__(self):
+        return len(self._buffer)
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        # Забираємо пачку в event loop, а пишемо в потоці — нові події йдуть у чистий буфер
+        rows = list(self._buffer)
+        self._buffer.clear()
+        try:
+            await asyncio.to_thread(insert_events, rows)
+        except Exception as e:
+            logger.error(f"❌ Events flush failed ({len(rows)} rows): {e}")
+            # Повертаємо на початок буфера, щоб не загубити при наступній спробі
+            self._buffer.extendleft(reversed(rows))
+            return 0
+        self.written += len(rows)
+        return len(rows)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+event_log = EventLog()
+
+
+def log_event(user_id, event, **fields):
+    event_log.log(user_id, event, **fields)
+
+
+def trip_date_iso(date_str: str) -> str:
+    """'dd.mm' з кнопок kb_dates -> 'YYYY-MM-DD' (рік підбираємо як у планувальнику)."""
+    now = datetime.now(pytz.timezone('Europe/Kyiv'))
+    trip_day = datetime.strptime(f"{date_str}.{now.year}", "%d.%m.%Y")
+    diff_days = (trip_day - now.replace(tzinfo=None)).days
+    if diff_days > 180: trip_day = trip_day.replace(year=now.year - 1)
+    elif diff_days < -180: trip_day = trip_day.replace(year=now.year + 1)
+    return trip_day.strftime("%Y-%m-%d")
@@ -1,4 +1,5 @@
 ﻿import os
+import shutil
 import asyncio
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from contextlib import suppress
@@ -14,9 +15,14 @@ from database import (
     get_top_routes, get_conversion_rate, get_financial_stats,
     get_peak_hours, get_top_failed_searches, get_top_sources,
     get_user, cancel_trip_full, get_all_active_trips_paginated,
-    get_trip_passengers, get_efficiency_stats
+    get_trip_passengers, get_efficiency_stats, get_unmet_demand,
+    search_cache, user_cache, cache_user_update,
+    banned_users, blocked_users
 )
 from config import DB_FILE, ADMIN_IDS
+from middlewares import flood_stats
+from backup import export_database
+from sender import bulk, outbound, sender_stats
 
 router = Router()
 
@@ -35,6 +41,8 @@ async def render_admin_dashboard(message: types.Message, edit: bool = False):
     gen_stats = await asyncio.to_thread(get_stats_general)
     ext_stats = await asyncio.to_thread(get_stats_extended)
     total_gmv = await asyncio.to_thread(get_financial_stats)
+    search_stats = search_cache.stats()
+    user_stats = user_cache.stats()
 
     text = (
         f"👨‍💻 <b>ПАНЕЛЬ АДМІНІСТРАТОРА v2.1</b>\n"
@@ -51,7 +59,17 @@ async def render_admin_dashboard(message: types.Message, edit: bool = False):
         f"• Завершених: <b>{gen_stats['finished_trips']}</b>\n"
         f"• Бронювань: <b>{gen_stats['total_bookings']}</b>\n"
         f"➖➖➖➖➖➖➖➖➖➖\n"
-        f"💰 <b>Обіг (GMV):</b> <code>{total_gmv} грн</code>"
+        f"💰 <b>Обіг (GMV):</b> <code>{total_gmv} грн</code>\n"
+        f"➖➖➖➖➖➖➖➖➖➖\n"
+        f"🛡 <b>Антифлуд:</b> пропущено {flood_stats['passed']} | "
+        f"відхилено {flood_stats['dropped']} | в черзі {flood_stats['heavy_waits']} | "
+        f"від забанених {flood_stats['banned']} (у бані {len(banned_users)})\n"
+        f"📤 <b>Відправка:</b> {sender_stats['sent:interactive']} + {sender_stats['sent:bulk']} масових | "
+        f"429: {sender_stats['retry_after']} (загальних {sender_stats['retry_after_global']}) | в черзі {outbound.queued}\n"
+        f"🔎 <b>Кеш пошуку:</b> {search_stats['hit_rate']:.0%} влучань "
+        f"({search_stats['hits']}/{search_stats['hits'] + search_stats['misses']}) | маршрутів {search_stats['routes']}\n"
+        f"👤 <b>Кеш профілів:</b> {user_stats['hit_rate']:.0%} влучань | "
+        f"читань з БД {user_stats['db_reads']} | у пам'яті {user_stats['size']}"
     )
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -200,9 +218,10 @@ async def admin_delete_trip_handler(call: types.CallbackQuery, state: FSMContext
         await call.answer("Поїздку видалено.", show_alert=True)
         
         # Сповіщення
-        with suppress(Exception): await call.bot.send_message(driver_id, f"⛔ <b>Вашу поїздку видалено адміністратором.</b>\n{trip_info['origin']} - {trip_info['destination']}", parse_mode="HTML")
-        for pid in passengers:
-            with suppress(Exception): await call.bot.send_message(pid, f"⚠️ <b>Поїздку скасовано адміністрацією.</b>\n{trip_info['origin']} - {trip_info['destination']}", parse_mode="HTML")
+        with bulk():
+            with suppress(Exception): await call.bot.send_message(driver_id, f"⛔ <b>Вашу поїздку видалено адміністратором.</b>\n{trip_info['origin']} - {trip_info['destination']}", parse_mode="HTML")
+            for pid in passengers:
+                with suppress(Exception): await call.bot.send_message(pid, f"⚠️ <b>Поїздку скасовано адміністрацією.</b>\n{trip_info['origin']} - {trip_info['destination']}", parse_mode="HTML")
     else:
         await call.answer("Поїздка вже не існує.", show_alert=True)
 
@@ -229,7 +248,7 @@ async def show_users_stats(call: types.CallbackQuery):
         f"• Пасажирів: <b>{stats['passengers']}</b>\n\n"
         f"<b>🔗 Джерела трафіку:</b>\n{sources_text}\n"
         f"<b>💀 Відтік (Block):</b> {stats['blocked']} юзерів\n"
-        f"<b>❤️ Лояльність (MAU):</b> {stats['mau']} активних за 30 днів"
+        f"<b>❤️ Лояльність:</b> DAU {stats['dau']} | WAU {stats['wau']} | MAU {stats['mau']} (30 днів)"
     )
     kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back_home")]])
     await call.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
@@ -239,6 +258,7 @@ async def show_product_stats(call: types.CallbackQuery):
     if call.from_user.id not in ADMIN_IDS: return
     conversion = await asyncio.to_thread(get_conversion_rate)
     failed = await asyncio.to_thread(get_top_failed_searches)
+    unmet = await asyncio.to_thread(get_unmet_demand, 5)
     eff = await asyncio.to_thread(get_efficiency_stats)
     
     text = (
@@ -253,6 +273,11 @@ async def show_product_stats(call: types.CallbackQuery):
     )
     for row in failed: text += f"• {row['event_data']} ({row['cnt']})\n"
     if not failed: text += "✅ Дефіциту немає."
+
+    text += "\n<b>🔥 Шукають зараз (без вільних місць):</b>\n"
+    for row in unmet:
+        text += f"• {row['origin']} ➝ {row['destination']}, {row['date'][8:10]}.{row['date'][5:7]}: {row['empty']} з {row['searches']} пошуків\n"
+    if not unmet: text += "✅ Попит покритий."
     
     kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back_home")]])
     await call.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
@@ -332,6 +357,9 @@ def _db_update_ban(uid, is_ban):
     conn.execute("UPDATE users SET is_banned = ? WHERE user_id = ?", (1 if is_ban else 0, uid))
     conn.commit()
     conn.close()
+    cache_user_update(uid, is_banned=1 if is_ban else 0)
+    if is_ban: banned_users.add(uid)
+    else: banned_users.discard(uid)
 
 @router.callback_query(F.data.startswith("admin_do_"))
 async def admin_do_action(call: types.CallbackQuery):
@@ -355,10 +383,12 @@ async def start_broadcast(call: types.CallbackQuery, state: FSMContext):
 # Функції для безпечної роботи з БД у потоках
 def _get_all_broadcast_users():
     conn = get_connection()
-    # Беремо ВСІХ активних юзерів одразу (список int займає мало пам'яті)
-    rows = conn.execute("SELECT user_id FROM users WHERE is_blocked_bot=0 AND is_banned=0").fetchall()
+    # Беремо ВСІХ юзерів одразу (список int займає мало пам'яті),
+    # забанених і тих, хто заблокував бота, відсіюємо за множинами в пам'яті
+    rows = conn.execute("SELECT user_id FROM users").fetchall()
     conn.close()
-    return [r[0] for r in rows]
+    skip = banned_users | blocked_users
+    return [r[0] for r in rows if r[0] not in skip]
 
 def _mark_users_blocked_batch(user_ids):
     if not user_ids: return
@@ -367,6 +397,9 @@ def _mark_users_blocked_batch(user_ids):
     conn.execute(f"UPDATE users SET is_blocked_bot=1 WHERE user_id IN ({placeholders})", user_ids)
     conn.commit()
     conn.close()
+    for uid in user_ids:
+        cache_user_update(uid, is_blocked_bot=1)
+    blocked_users.update(user_ids)
 
 @router.message(AdminStates.broadcast)
 async def do_broadcast(message: types.Message, state: FSMContext, bot: Bot):
@@ -393,9 +426,9 @@ async def do_broadcast(message: types.Message, state: FSMContext, bot: Bot):
             # 2. Обробляємо пачку (Async I/O)
             for user_id in batch:
                 try: 
+                    # Темп (30/с) і 429 тримає sender.py, відповіді іншим юзерам ідуть поза чергою
                     await message.copy_to(user_id)
                     good += 1           
-                    await asyncio.sleep(0.04) # Невеликий сліп для лімітів Telegram
                 except TelegramForbiddenError:
                     blocked_in_this_batch.append(user_id)
                     bad += 1
@@ -413,12 +446,24 @@ async def do_broadcast(message: types.Message, state: FSMContext, bot: Bot):
 
         await bot.send_message(message.chat.id, f"✅ <b>Розсилка завершена!</b>\n👍 Успішно: {good}\n💀 Заблокували: {bad}")
 
-    asyncio.create_task(worker())
+    with bulk():
+        asyncio.create_task(worker())  # задача успадковує bulk-пріоритет
     await message.answer("⏳ Процес пішов у фоні. Можете користуватись ботом.", reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🏠 Додому", callback_data="admin_back_home")]]))
     await state.clear()
 
 @router.callback_query(F.data == "admin_export_db")
 async def export_db(call: types.CallbackQuery):
-    if call.from_user.id in ADMIN_IDS and os.path.exists(DB_FILE): 
-        await call.message.answer_document(FSInputFile(DB_FILE))
-    await call.answer()
\ No newline at end of file
+    if call.from_user.id not in ADMIN_IDS or not os.path.exists(DB_FILE):
+        return await call.answer()
+    await call.answer("⏳ Готую копію бази...")
+
+    # Знімок через backup API в окремому потоці — бот під час експорту працює далі
+    workdir, parts, info = await asyncio.to_thread(export_database)
+    try:
+        for i, part in enumerate(parts, 1):
+            caption = f"💾 {info['bytes'] // 1024} KB, {info['seconds']} с" if i == 1 else None
+            if len(parts) > 1:
+                caption = f"{caption or ''}\n📦 Частина {i}/{len(parts)} (cat *.part* > backup)".strip()
+            await call.message.answer_document(FSInputFile(part), caption=caption)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
\ No newline at end of file
@@ -1,4 +1,5 @@
 ﻿import asyncio
+import logging
 from contextlib import suppress
 from aiogram import Router, F, types, Bot
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
@@ -14,6 +15,7 @@ from database import (
 )
 from keyboards import kb_menu
 
+logger = logging.getLogger(__name__)
 router = Router()
 
 EXIT_TEXT = "❌ Завершити діалог"
@@ -273,5 +275,5 @@ async def chat_relay_handler(message: types.Message, bot: Bot):
             await message.delete()
             
     except Exception as e:
-        print(f"Chat Relay Error: {e}")
+        logger.error(f"Chat Relay Error: {e}")
         await message.answer("❌ <b>Помилка доставки!</b> Спробуйте ще раз.")
\ No newline at end of file
@@ -1,4 +1,5 @@
 ﻿import asyncio
+import logging
 from contextlib import suppress
 from aiogram import Router, F, types, Bot
 from aiogram.filters import Command, CommandStart
@@ -15,6 +16,7 @@ from utils import clean_user_input, update_or_send_msg, delete_messages_list, de
 from states import SupportStates
 from config import SUPPORT_CHANNEL_ID
 
+logger = logging.getLogger(__name__)
 router = Router()
 
 # ==========================================
@@ -289,7 +291,7 @@ async def support_finish(call: types.CallbackQuery, state: FSMContext, bot: Bot)
                 # Маленька пауза, щоб зберегти порядок повідомлень
                 await asyncio.sleep(0.1) 
             except Exception as e:
-                print(f"Failed to copy support msg {mid}: {e}")
+                logger.warning(f"Failed to copy support msg {mid}: {e}")
 
         # 4. Повідомляємо юзеру успіх
         await call.answer("Запит надіслано успішно!", show_alert=True)
@@ -302,7 +304,7 @@ async def support_finish(call: types.CallbackQuery, state: FSMContext, bot: Bot)
                 await asyncio.sleep(0.05)
                 
     except Exception as e:
-        print(f"Global Support Error: {e}")
+        logger.error(f"Global Support Error: {e}")
         await call.message.answer("⚠️ Помилка відправки. Спробуйте пізніше.")
 
     # Повертаємо на головне меню
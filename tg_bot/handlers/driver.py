@@ -16,11 +16,14 @@ from database import (
     get_user, save_user, create_trip, get_driver_active_trips, 
     get_trip_passengers, cancel_trip_full, kick_passenger, 
     get_last_driver_trip, get_subscribers_for_trip,
-    add_or_update_city, finish_trip, log_event,
+    add_or_update_city, finish_trip,
     get_driver_history, get_active_driver_trips,
-    get_trip_details
+    get_trip_details, get_unmet_demand
 )
 from handlers.rating import ask_for_ratings 
+from limits import active_driver_trips
+from events import log_event, trip_date_iso
+from sender import bulk
 from states import TripStates
 from keyboards import kb_back, kb_dates, kb_menu
 
@@ -56,17 +59,13 @@ async def start_create_trip_handler(call: types.CallbackQuery, state: FSMContext
         await update_or_send_msg(bot, call.message.chat.id, state, "⚠️ <b>Ви не можете створити поїздку!</b>\nПотрібно вказати авто та номер телефону в профілі.", kb)
         return
 
-    active_trips = get_driver_active_trips(call.from_user.id)
-    if len(active_trips) >= 2:
+    allowed, reason = active_driver_trips.check(call.from_user.id)
+    if not allowed:
         kb = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🗂 Мої поїздки", callback_data="drv_my_trips")],
             [InlineKeyboardButton(text="🔙 В меню", callback_data="menu_home")]
         ])
-        await update_or_send_msg(
-            bot, call.message.chat.id, state, 
-            "🚫 <b>Ліміт вичерпано!</b>\nУ вас вже є 2 активні поїздки.\nЗавершіть або скасуйте старі, щоб створити нову.", 
-            kb
-        )
+        await update_or_send_msg(bot, call.message.chat.id, state, reason, kb)
         return
 
     last_trip = get_last_driver_trip(call.from_user.id)
@@ -101,12 +100,24 @@ async def repeat_route_selected(call: types.CallbackQuery, state: FSMContext):
     await update_or_send_msg(call.bot, call.message.chat.id, state, "📅 <b>Дата нової поїздки?</b>", kb_dates("tripdate"))
 
 
+def _format_demand_hint(rows) -> str:
+    """💡 Підказка водію: куди шукають і не знаходять."""
+    if not rows: return ""
+    today = datetime.now(pytz.timezone('Europe/Kyiv')).date()
+    lines = []
+    for row in rows:
+        days = (datetime.strptime(row['date'], "%Y-%m-%d").date() - today).days
+        when = "сьогодні" if days == 0 else ("завтра" if days == 1 else f"{row['date'][8:10]}.{row['date'][5:7]}")
+        lines.append(f"• {row['origin']} ➝ {row['destination']} ({when})")
+    return "\n\n💡 <b>Пасажири шукають, але не знаходять:</b>\n" + "\n".join(lines)
+
 async def _start_new_trip_questions(chat_id, state: FSMContext, bot: Bot):
     await state.set_state(TripStates.origin)
-    await update_or_send_msg(bot, chat_id, state, "📍 <b>Звідки виїжджаємо?</b>\nВведіть місто (напр. Львів):", kb_back())
+    hint = _format_demand_hint(await asyncio.to_thread(get_unmet_demand, 3))
+    await update_or_send_msg(bot, chat_id, state, f"📍 <b>Звідки виїжджаємо?</b>\nВведіть місто (напр. Львів):{hint}", kb_back())
 
 
-@router.message(TripStates.origin)
+@router.message(TripStates.origin, flags={"rate_cost": 2, "heavy": "geocode"})
 async def process_origin(message: types.Message, state: FSMContext, bot: Bot):
     await clean_user_input(message)
     
@@ -135,7 +146,7 @@ async def process_origin(message: types.Message, state: FSMContext, bot: Bot):
         await update_or_send_msg(bot, message.chat.id, state, f"❌ <b>Не знайшов місто '{raw_text}'.</b>\nСпробуйте ще раз:", kb_back())
 
 
-@router.message(TripStates.destination)
+@router.message(TripStates.destination, flags={"rate_cost": 2, "heavy": "geocode"})
 async def process_destination(message: types.Message, state: FSMContext, bot: Bot):
     await clean_user_input(message)
     
@@ -343,7 +354,7 @@ async def finalize_trip_creation(message: types.Message, state: FSMContext, bot:
         description
     )
     
-    log_event(message.chat.id, "trip_created", f"{data['origin']}->{data['destination']}")
+    log_event(message.chat.id, "trip_created", trip_id=trip_id, origin=data['origin'], destination=data['destination'], value=int(data['seats']), trip_date=trip_date_iso(data['date']))
     
     bot_info = await bot.get_me()
     deep_link = f"https://t.me/{bot_info.username}?start=book_{trip_id}"
@@ -379,9 +390,10 @@ async def _notify_subscribers(bot, driver_id, trip_id, trip_data, price, descrip
         f"⏰ {trip_data['time']} | 💰 {price} грн{desc_line}"
     )
     kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="✅ Бронювати", callback_data=f"book_{trip_id}")]])
-    for sub_id in subscribers:
-        if sub_id != driver_id:
-            with suppress(Exception): await bot.send_message(sub_id, text, reply_markup=kb, parse_mode="HTML")
+    with bulk():
+        for sub_id in subscribers:
+            if sub_id != driver_id:
+                with suppress(Exception): await bot.send_message(sub_id, text, reply_markup=kb, parse_mode="HTML")
 
 
 # ==========================================
@@ -534,11 +546,14 @@ async def ask_cancel_trip(call: types.CallbackQuery):
 
 @router.callback_query(F.data.startswith("drv_conf_cancel_"))
 async def confirm_cancel_trip(call: types.CallbackQuery, state: FSMContext):
-    trip_info, passengers = cancel_trip_full(call.data.split("_")[3], call.from_user.id)
+    trip_id = call.data.split("_")[3]
+    trip_info, passengers = cancel_trip_full(trip_id, call.from_user.id)
+    log_event(call.from_user.id, "trip_cancelled", trip_id=trip_id, value=len(passengers))
     await call.answer("Поїздку скасовано.")
-    for pid in passengers:
-        with suppress(Exception): 
-            await call.bot.send_message(pid, f"🚫 <b>УВАГА!</b>\nВодій скасував поїздку {trip_info['origin']} - {trip_info['destination']}.", parse_mode="HTML", reply_markup=kb_ok)
+    with bulk():
+        for pid in passengers:
+            with suppress(Exception): 
+                await call.bot.send_message(pid, f"🚫 <b>УВАГА!</b>\nВодій скасував поїздку {trip_info['origin']} - {trip_info['destination']}.", parse_mode="HTML", reply_markup=kb_ok)
     await show_driver_trips(call, state)
 
 @router.callback_query(F.data.startswith("kick_ask_"))
@@ -554,6 +569,7 @@ async def ask_kick_passenger(call: types.CallbackQuery):
 async def confirm_kick_passenger(call: types.CallbackQuery, state: FSMContext):
     info = kick_passenger(int(call.data.split("_")[2]), call.from_user.id)
     if info:
+        log_event(call.from_user.id, "passenger_kicked", trip_id=info['trip_id'])
         await call.answer("Пасажира висаджено.")
         with suppress(Exception): 
             await call.bot.send_message(info['passenger_id'], "🚫 <b>Водій скасував ваше бронювання.</b>", parse_mode="HTML", reply_markup=kb_ok)
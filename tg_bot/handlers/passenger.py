@@ -1,4 +1,5 @@
 ﻿import asyncio
+import logging
 import html
 from contextlib import suppress
 from aiogram import Router, F, types, Bot
@@ -10,17 +11,21 @@ from utils import safe_html, clean_user_input, update_or_send_msg, delete_messag
 from database import (
     search_trips, search_trips_page, add_booking, get_user, get_user_bookings, 
     get_trip_details, delete_booking, get_recent_searches, save_search_history,
-    add_subscription, get_user_rating, format_rating, log_event,
+    add_subscription, get_user_rating, format_rating,
     add_or_update_city, get_passenger_history, 
-    get_user_active_bookings_count, can_user_book, log_cancellation_event,
     get_city_suggestion
 )
+from limits import booking_cancellations, active_bookings
+from events import log_event, trip_date_iso
+from sender import send_later
 from states import SearchStates
 from keyboards import kb_dates, kb_menu, kb_back
+from config import SEARCH_RESULTS_MODE
 
 # Імпорт валідації міст
 from utils import validate_city_real
 
+logger = logging.getLogger(__name__)
 router = Router()
 
 # Універсальна кнопка для закриття сповіщень
@@ -116,7 +121,7 @@ async def history_search_select(call: types.CallbackQuery, state: FSMContext):
     await state.set_state(SearchStates.date)
     await update_or_send_msg(call.bot, call.message.chat.id, state, f"🚀 <b>{parts[1]} ➝ {parts[2]}</b>\n📅 <b>Коли їдемо?</b>", kb_dates("sdate"))
 
-@router.message(SearchStates.origin)
+@router.message(SearchStates.origin, flags={"rate_cost": 2, "heavy": "geocode"})
 async def process_search_origin(message: types.Message, state: FSMContext, bot: Bot):
     await clean_user_input(message)
     
@@ -144,7 +149,7 @@ async def process_search_origin(message: types.Message, state: FSMContext, bot:
     else:
         await update_or_send_msg(bot, message.chat.id, state, "❌ <b>Місто не знайдено.</b> Спробуйте ще раз:", kb_back())
 
-@router.message(SearchStates.dest)
+@router.message(SearchStates.dest, flags={"rate_cost": 2, "heavy": "geocode"})
 async def process_search_dest(message: types.Message, state: FSMContext, bot: Bot):
     await clean_user_input(message)
     
@@ -179,7 +184,7 @@ async def process_search_dest(message: types.Message, state: FSMContext, bot: Bo
     else:
         await update_or_send_msg(bot, message.chat.id, state, "❌ <b>Місто не знайдено.</b> Спробуйте ще раз:", kb_back())
 
-@router.callback_query(SearchStates.date, F.data.startswith("sdate_"))
+@router.callback_query(SearchStates.date, F.data.startswith("sdate_"), flags={"rate_cost": 3, "heavy": "search"})
 async def execute_search(call: types.CallbackQuery, state: FSMContext):
     date_val = call.data.split("_")[1]
     data = await state.get_data()
@@ -202,30 +207,101 @@ async def execute_search(call: types.CallbackQuery, state: FSMContext):
         ])
         msg = await call.message.answer(f"😔 <b>Поїздок не знайдено.</b>\n{data['origin']} -> {data['dest']} на {date_val}", reply_markup=kb, parse_mode="HTML")
         await state.update_data(search_msg_ids=[msg.message_id])
-        log_event(call.from_user.id, "search_empty", f"{data['origin']}->{data['dest']}")
+        log_event(call.from_user.id, "search_empty", origin=data['origin'], destination=data['dest'], trip_date=trip_date_iso(date_val))
         return
 
-    log_event(call.from_user.id, "search_success", f"{data['origin']}->{data['dest']} ({count})")
+    log_event(call.from_user.id, "search_success", origin=data['origin'], destination=data['dest'], value=count, trip_date=trip_date_iso(date_val))
     await _render_trips_page(call.message, state)
 
 # ==========================================
 # 📄 ПАГІНАЦІЯ
 # ==========================================
 
-async def _render_trips_page(message: types.Message, state: FSMContext):
-    await delete_messages_list(state, message.bot, message.chat.id, "search_msg_ids")
+async def _render_trips_page(message: types.Message, state: FSMContext, edit: bool = False):
+    """edit=True — гортання: у compact-режимі редагуємо це ж повідомлення."""
+    if SEARCH_RESULTS_MODE == "messages":
+        await _render_trips_page_messages(message, state)
+    else:
+        await _render_trips_page_compact(message, state, edit)
+
 
+async def _load_trips_page(state: FSMContext, user_id: int):
     data = await state.get_data()
     page = data.get('current_page', 0)
     
     trips, total_count = await asyncio.to_thread(
         search_trips_page, 
         data['origin'], data['dest'], data['date'], 
-        message.chat.id, PAGE_SIZE, page * PAGE_SIZE
+        user_id, PAGE_SIZE, page * PAGE_SIZE
     )
     
     if total_count == 0: total_pages = 1
     else: total_pages = (total_count - 1) // PAGE_SIZE + 1
+    return trips, total_count, page, total_pages
+
+
+def _trip_card(trip) -> str:
+    avg, count = get_user_rating(trip['user_id'], role="driver")
+    
+    safe_desc = safe_html(trip.get('description', ''))
+    desc_line = f"\n💬 <i>{safe_desc}</i>" if safe_desc else ""
+    
+    safe_driver_name = safe_html(trip['driver_name'])
+    safe_origin = safe_html(trip['origin'])
+    safe_dest = safe_html(trip['destination'])
+    safe_car = safe_html(f"{trip['model']} {trip['color']}")
+
+    return (
+        f"🚗 <b>{safe_origin} ➝ {safe_dest}</b>\n"
+        f"📅 {trip['date']} | ⏰ {trip['time']} | 💰 <b>{trip['price']} грн</b>\n"
+        f"👤 {safe_driver_name} ({format_rating(avg, count)}){desc_line}\n"
+        f"🚙 {safe_car}"
+    )
+
+
+def _nav_rows(page: int, total_count: int) -> list:
+    nav_btns = []
+    if page > 0: 
+        nav_btns.append(InlineKeyboardButton(text="⬅️", callback_data="page_prev"))
+    if (page + 1) * PAGE_SIZE < total_count: 
+        nav_btns.append(InlineKeyboardButton(text="➡️", callback_data="page_next"))
+    return [
+        nav_btns,
+        [InlineKeyboardButton(text="🔍 Новий пошук", callback_data="pass_find")],
+        [InlineKeyboardButton(text="🏠 В меню", callback_data="menu_home")]
+    ]
+
+
+async def _render_trips_page_compact(message: types.Message, state: FSMContext, edit: bool):
+    """Уся сторінка — одне повідомлення з кнопками під кожну поїздку; гортання = 1 editMessageText."""
+    trips, total_count, page, total_pages = await _load_trips_page(state, message.chat.id)
+
+    cards = [f"<b>{i}.</b> {_trip_card(trip)}" for i, trip in enumerate(trips, start=page * PAGE_SIZE + 1)]
+    text = f"🔎 <b>Знайдено {total_count} варіантів (Стор. {page+1}/{total_pages})</b>\n\n" + "\n\n".join(cards)
+
+    rows = [
+        [InlineKeyboardButton(text=f"✅ Бронювати №{i}", callback_data=f"book_{trip['id']}"),
+         InlineKeyboardButton(text=f"💬 №{i}", callback_data=f"chat_start_{trip['user_id']}")]
+        for i, trip in enumerate(trips, start=page * PAGE_SIZE + 1)
+    ]
+    kb = InlineKeyboardMarkup(inline_keyboard=rows + _nav_rows(page, total_count))
+
+    if edit:
+        try:
+            await message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+            return
+        except TelegramBadRequest as e:
+            if "not modified" in str(e): return
+            # Повідомлення застаре для редагування — малюємо заново
+    await delete_messages_list(state, message.bot, message.chat.id, "search_msg_ids")
+    msg = await message.answer(text, reply_markup=kb, parse_mode="HTML")
+    await state.update_data(search_msg_ids=[msg.message_id])
+
+
+async def _render_trips_page_messages(message: types.Message, state: FSMContext):
+    await delete_messages_list(state, message.bot, message.chat.id, "search_msg_ids")
+
+    trips, total_count, page, total_pages = await _load_trips_page(state, message.chat.id)
     
     msg_ids = []
     
@@ -233,22 +309,7 @@ async def _render_trips_page(message: types.Message, state: FSMContext):
     msg_ids.append(h.message_id)
     
     for trip in trips:
-        avg, count = get_user_rating(trip['user_id'], role="driver")
-        
-        safe_desc = safe_html(trip.get('description', ''))
-        desc_line = f"\n💬 <i>{safe_desc}</i>" if safe_desc else ""
-        
-        safe_driver_name = safe_html(trip['driver_name'])
-        safe_origin = safe_html(trip['origin'])
-        safe_dest = safe_html(trip['destination'])
-        safe_car = safe_html(f"{trip['model']} {trip['color']}")
-
-        txt = (
-            f"🚗 <b>{safe_origin} ➝ {safe_dest}</b>\n"
-            f"📅 {trip['date']} | ⏰ {trip['time']} | 💰 <b>{trip['price']} грн</b>\n"
-            f"👤 {safe_driver_name} ({format_rating(avg, count)}){desc_line}\n"
-            f"🚙 {safe_car}"
-        )     
+        txt = _trip_card(trip)
         
         kb = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="✅ Бронювати", callback_data=f"book_{trip['id']}")],
@@ -257,34 +318,24 @@ async def _render_trips_page(message: types.Message, state: FSMContext):
         m = await message.answer(txt, reply_markup=kb, parse_mode="HTML")
         msg_ids.append(m.message_id)
         
-    nav_btns = []
-    if page > 0: 
-        nav_btns.append(InlineKeyboardButton(text="⬅️", callback_data="page_prev"))
-    if (page + 1) * PAGE_SIZE < total_count: 
-        nav_btns.append(InlineKeyboardButton(text="➡️", callback_data="page_next"))
-    
-    kb_nav = InlineKeyboardMarkup(inline_keyboard=[
-        nav_btns,
-        [InlineKeyboardButton(text="🔍 Новий пошук", callback_data="pass_find")],
-        [InlineKeyboardButton(text="🏠 В меню", callback_data="menu_home")]
-    ])
+    kb_nav = InlineKeyboardMarkup(inline_keyboard=_nav_rows(page, total_count))
     
     nav_msg = await message.answer("🔽 Навігація:", reply_markup=kb_nav)
     msg_ids.append(nav_msg.message_id)
     
     await state.update_data(search_msg_ids=msg_ids)
 
-@router.callback_query(F.data == "page_next")
+@router.callback_query(F.data == "page_next", flags={"heavy": "search"})
 async def next_page(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     await state.update_data(current_page=data['current_page'] + 1)
-    await _render_trips_page(call.message, state)
+    await _render_trips_page(call.message, state, edit=True)
 
-@router.callback_query(F.data == "page_prev")
+@router.callback_query(F.data == "page_prev", flags={"heavy": "search"})
 async def prev_page(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     await state.update_data(current_page=data['current_page'] - 1)
-    await _render_trips_page(call.message, state)
+    await _render_trips_page(call.message, state, edit=True)
 
 # ==========================================
 # 🎫 БРОНЮВАННЯ
@@ -299,15 +350,15 @@ async def book_trip(call: types.CallbackQuery, state: FSMContext):
 
     user_id = call.from_user.id
     
-    allowed, reason = can_user_book(user_id)
+    allowed, reason = booking_cancellations.check(user_id)
     if not allowed:
         await call.answer("Блокування дій!", show_alert=True)
         await call.message.answer(reason, parse_mode="HTML")
         return
 
-    active_count = get_user_active_bookings_count(user_id)
-    if active_count >= 2:
-        await call.answer("⚠️ Ліміт! У вас вже є 2 активні поїздки.", show_alert=True)
+    allowed, reason = active_bookings.check(user_id)
+    if not allowed:
+        await call.answer(reason, show_alert=True)
         return
 
     user = get_user(user_id)
@@ -330,7 +381,7 @@ async def book_trip(call: types.CallbackQuery, state: FSMContext):
     success, msg_text = add_booking(trip_id, user_id)
     
     if success:
-        log_event(user_id, "booking_success", f"trip_{trip_id}")
+        log_event(user_id, "booking_success", trip_id=trip_id)
         trip = get_trip_details(trip_id)
         
         # 🔥 ФІКС ПРОБЛЕМИ: Очистка ReplyKeyboard
@@ -348,13 +399,12 @@ async def book_trip(call: types.CallbackQuery, state: FSMContext):
         )
         await state.update_data(last_msg_id=msg.message_id)
         
-        with suppress(Exception):
-            await call.bot.send_message(
-                trip['user_id'], 
-                f"🆕 <b>Новий пасажир!</b>\nНа ваш рейс додався {call.from_user.full_name}.", 
-                parse_mode="HTML", 
-                reply_markup=kb_ok
-            )
+        send_later(call.bot.send_message(
+            trip['user_id'], 
+            f"🆕 <b>Новий пасажир!</b>\nНа ваш рейс додався {call.from_user.full_name}.", 
+            parse_mode="HTML", 
+            reply_markup=kb_ok
+        ))
             
     else:
         await call.answer(msg_text, show_alert=True)
@@ -378,7 +428,7 @@ async def show_bookings(call: types.CallbackQuery, state: FSMContext):
     try:
         bookings = get_user_bookings(call.from_user.id)
     except Exception as e:
-        print(f"❌ DB Error: {e}")
+        logger.error(f"❌ DB Error: {e}")
         bookings = []
 
     msg_ids = []
@@ -466,11 +516,11 @@ async def ask_cancel_booking(call: types.CallbackQuery):
 async def confirm_cancel_booking(call: types.CallbackQuery, state: FSMContext):
     info = delete_booking(int(call.data.split("_")[3]), call.from_user.id)
     if info:
-        log_cancellation_event(call.from_user.id) 
+        booking_cancellations.hit(call.from_user.id)
+        log_event(call.from_user.id, "booking_cancelled", trip_id=info.get('trip_id'))
         await call.answer("Скасовано.")
-        with suppress(Exception): 
-            p_name = info['passenger_name'] or "Пасажир"
-            await call.bot.send_message(info['driver_id'], f"❌ <b>{p_name} скасував бронювання.</b>\nМісце знову вільне.", parse_mode="HTML", reply_markup=kb_ok)
+        p_name = info['passenger_name'] or "Пасажир"
+        send_later(call.bot.send_message(info['driver_id'], f"❌ <b>{p_name} скасував бронювання.</b>\nМісце знову вільне.", parse_mode="HTML", reply_markup=kb_ok))
         await show_bookings(call, state)
 
 @router.callback_query(F.data.startswith("sub_"))
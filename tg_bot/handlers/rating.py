@@ -1,9 +1,12 @@
 ﻿import asyncio
+import logging
 from contextlib import suppress
 from aiogram import Router, F, types, Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from database import add_rating, get_user
+from sender import bulk
 
+logger = logging.getLogger(__name__)
 router = Router()
 
 def kb_rate_stars(target_id, trip_id, role):
@@ -30,7 +33,7 @@ async def process_rating(call: types.CallbackQuery):
         add_rating(from_id, target_id, trip_id, role_being_rated, score)
         success = True
     except Exception as e:
-        print(f"Rating Error: {e}")
+        logger.error(f"Rating Error: {e}")
         success = False
     
     if success:
@@ -59,8 +62,13 @@ async def process_rating(call: types.CallbackQuery):
 # Функція запуску опитування (викликається з інших хендлерів)
 async def ask_for_ratings(bot: Bot, trip_id: str, driver_id: int, passengers: list):
     """
-    Розсилає запити на оцінку всім учасникам.
+    Розсилає запити на оцінку всім учасникам (з низьким пріоритетом, див. sender.py).
     """
+    with bulk():
+        await _send_rating_requests(bot, trip_id, driver_id, passengers)
+
+
+async def _send_rating_requests(bot: Bot, trip_id: str, driver_id: int, passengers: list):
     # 1. Просимо ПАСАЖИРІВ оцінити ВОДІЯ
     driver_info = get_user(driver_id)
     if driver_info:
@@ -0,0 +1,56 @@
+﻿import time
+
+from database import count_actions, log_action, get_user_active_bookings_count, count_driver_active_trips, ACTION_LOG_RETENTION
+
+# ==========================================
+# 🚦 ЛІМІТИ (АНТИ-АБЮЗ)
+# ==========================================
+# Два види перевірок з однаковим інтерфейсом check(user_id) -> (дозволено, причина):
+#   • SlidingWindowLimit — не більше limit дій за останні window секунд
+#     (журнал action_log, див. database.py); дію фіксує hit(user_id);
+#   • ActiveCountLimit — не більше limit "живих" об'єктів (броні, поїздки),
+#     рахує передана функція по індексу.
+# Викликаються синхронно, як і решта функцій бази в хендлерах.
+
+
+class SlidingWindowLimit:
+    def __init__(self, action: str, limit: int, window: float, reason: str, clock=time.time):
+        if window > ACTION_LOG_RETENTION:
+            raise ValueError(f"Вікно {action} ({window} с) довше за ACTION_LOG_RETENTION")
+        self.action = action
+        self.limit = limit
+        self.window = window
+        self.reason = reason
+        self.clock = clock
+
+    def check(self, user_id: int) -> tuple:
+        used = count_actions(user_id, self.action, self.clock() - self.window)
+        return (False, self.reason) if used >= self.limit else (True, "")
+
+    def hit(self, user_id: int):
+        now = self.clock()
+        log_action(user_id, self.action, now, now - self.window)
+
+
+class ActiveCountLimit:
+    def __init__(self, counter, limit: int, reason: str):
+        self.counter = counter
+        self.limit = limit
+        self.reason = reason
+
+    def check(self, user_id: int) -> tuple:
+        return (False, self.reason) if self.counter(user_id) >= self.limit else (True, "")
+
+
+booking_cancellations = SlidingWindowLimit(
+    "booking_cancel", limit=3, window=86400,
+    reason="🚫 <b>Блокування на 24 години!</b>\nВи занадто часто скасовували бронювання."
+)
+active_bookings = ActiveCountLimit(
+    get_user_active_bookings_count, limit=2,
+    reason="⚠️ Ліміт! У вас вже є 2 активні поїздки."
+)
+active_driver_trips = ActiveCountLimit(
+    count_driver_active_trips, limit=2,
+    reason="🚫 <b>Ліміт вичерпано!</b>\nУ вас вже є 2 активні поїздки.\nЗавершіть або скасуйте старі, щоб створити нову."
+)
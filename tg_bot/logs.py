@@ -0,0 +1,119 @@
+﻿import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# ==========================================
+# 📝 ЛОГУВАННЯ ЧЕРЕЗ ЧЕРГУ
+# ==========================================
+# Хендлери в event loop лише кладуть запис у чергу (мікросекунди),
+# а форматування, запис у файл і ротацію робить окремий потік QueueListener.
+# Якщо потік не встигає і черга заповнена — запис відкидається (log_stats["dropped"]),
+# бо блокувати loop через лог гірше, ніж втратити рядок.
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+QUEUE_SIZE = 100_000
+log_stats = Counter()   # queued / dropped / sampled_out
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-рядок на запис (для збирачів логів)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class UpdateLogSampler(logging.Filter):
+    """
+    Проріджує "Update id=... is handled. Duration N ms" від aiogram.event:
+    пропускає частку rate, але завжди — необроблені та повільні апдейти.
+    """
+
+    def __init__(self, rate: float, slow_ms: float = 1000):
+        super().__init__()
+        self.rate = rate
+        self.slow_ms = slow_ms
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        if record.levelno > logging.INFO or not isinstance(args, tuple) or len(args) < 3:
+            return True
+        if args[1] != "handled" or args[2] >= self.slow_ms:
+            return True
+        if random.random() < self.rate:
+            return True
+        log_stats["sampled_out"] += 1
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            log_stats["queued"] += 1
+        except queue.Full:
+            log_stats["dropped"] += 1
+
+
+def build_handlers(json_format: bool = False, log_file: str = "bot.log") -> list:
+    formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    handlers = [console_handler]
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=1, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    return handlers
+
+
+def setup_queue_logging(handlers: list, level: int = logging.INFO, update_sample_rate: float = 1.0,
+                        slow_update_ms: float = 1000, queue_size: int = QUEUE_SIZE) -> QueueListener:
+    """
+    Вішає на root лише DroppingQueueHandler, реальні handlers працюють у потоці listener.
+    Listener зупиняється при виході з процесу (stop() дописує все, що лишилось у черзі).
+    """
+    global _listener
+    stop_queue_logging()
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    event_logger = logging.getLogger("aiogram.event")
+    for old in [f for f in event_logger.filters if isinstance(f, UpdateLogSampler)]:
+        event_logger.removeFilter(old)
+    if update_sample_rate < 1.0:
+        event_logger.addFilter(UpdateLogSampler(update_sample_rate, slow_update_ms))
+
+    listener.start()
+    _listener = listener
+    return listener
+
+
+@atexit.register
+def stop_queue_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
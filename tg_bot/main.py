@@ -2,10 +2,8 @@
 import logging
 import sys
 import os
-import sentry_sdk
 from datetime import datetime
 import pytz
-from logging.handlers import RotatingFileHandler
 
 from aiogram import Bot, Dispatcher, types
 from aiogram.fsm.storage.memory import MemoryStorage
@@ -16,16 +14,25 @@ from aiogram.types import ChatMemberUpdated
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # 👇 Імпортуємо налаштування (переконайся, що в config.py є SENTRY_DSN)
-from config import API_TOKEN, SENTRY_DSN
+from config import API_TOKEN, SENTRY_DSN, LOG_FILE, LOG_JSON, LOG_UPDATE_SAMPLE_RATE, SENTRY_SLOW_UPDATE_MS
 
 # Імпорти модулів проекту
-from middlewares import AntiFloodMiddleware, ActivityMiddleware
+from middlewares import AntiFloodMiddleware, ActivityMiddleware, BanMiddleware
+from tracing import TracingMiddleware, init_sentry, tracing_config
+from sender import outbound, bulk
+from logs import build_handlers, setup_queue_logging
+from activity import activity_tracker
+from events import event_log
+from backup import run_full_backup, run_incremental_backup
+from migrate import ensure_schema_current, SchemaOutdatedError
 from database import (
-    init_db, set_user_blocked_bot, 
+    set_user_blocked_bot, 
     perform_db_cleanup, archive_old_trips_db, 
     mark_trip_finished, get_trip_passengers,
-    get_bookings_to_remind, mark_booking_reminded
+    get_bookings_to_remind, mark_booking_reminded,
+    get_counters, load_user_flags
 )
+from utils import warm_up_search
 
 # Імпорти хендлерів
 from handlers import common, passenger, driver, admin, profile, chat, rating
@@ -35,18 +42,18 @@ from handlers.rating import ask_for_ratings
 # ⚙️ НАЛАШТУВАННЯ ЛОГУВАННЯ
 # ==========================================
 def setup_logging():
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    
-    file_handler = RotatingFileHandler("bot.log", maxBytes=5*1024*1024, backupCount=1, encoding="utf-8")
-    file_handler.setFormatter(formatter)
-    
-    logging.basicConfig(level=logging.INFO, handlers=[console_handler, file_handler])
+    # Консоль + bot.log пишуться в окремому потоці (logs.py), loop лише кладе записи в чергу
+    setup_queue_logging(
+        build_handlers(json_format=LOG_JSON, log_file=LOG_FILE),
+        update_sample_rate=LOG_UPDATE_SAMPLE_RATE,
+        slow_update_ms=SENTRY_SLOW_UPDATE_MS,
+    )
 
     if SENTRY_DSN:
-        sentry_sdk.init(dsn=SENTRY_DSN, traces_sample_rate=1.0, profiles_sample_rate=1.0)
-        logging.info("✅ Sentry успішно підключено!")
+        # Відбір транзакцій і профілів — tracing.py (SENTRY_TRACES_RATE, SENTRY_TRACE_RULES...)
+        init_sentry(SENTRY_DSN)
+        logging.info(f"✅ Sentry успішно підключено! (traces {tracing_config.default_rate:.0%}, "
+                     f"{'tail' if tracing_config.tail else 'head'}-sampling)")
     else:
         logging.warning("⚠️ SENTRY_DSN не знайдено.")
 
@@ -112,7 +119,12 @@ async def background_tasks(bot: Bot):
                 logger.info("👌 Всі поїздки актуальні.")
 
             # Очистка сміття в базі (видалення дуже старих записів)
-            await asyncio.to_thread(perform_db_cleanup)
+            report = await asyncio.to_thread(perform_db_cleanup)
+            logger.info(
+                f"🧹 Очистка: видалено {report['deleted'] or 0}, {report['batches']} транзакцій, "
+                f"блокування {report['lock_ms']} мс (макс {report['max_lock_ms']} мс), "
+                f"vacuum {report['vacuum_pages']} стор., всього {report['elapsed_ms']} мс"
+            )
 
         except Exception as e:
             logger.exception(f"⚠️ Background Task Error") 
@@ -135,6 +147,10 @@ async def global_error_handler(event: types.ErrorEvent):
     return True
 
 async def check_reminders_job(bot: Bot):
+    with bulk():
+        await _send_reminders(bot)
+
+async def _send_reminders(bot: Bot):
     try:
         bookings = await asyncio.to_thread(get_bookings_to_remind)
         kyiv_tz = pytz.timezone('Europe/Kyiv')
@@ -155,11 +171,10 @@ async def check_reminders_job(bot: Bot):
                 # Нагадування за 1 годину (30-90 хв)
                 if 1800 < diff < 5400:
                     text = f"⏰ <b>Нагадування!</b>\nЧерез годину ({b['time']}) поїздка: {b['origin']} ➝ {b['destination']}."
-                    with sentry_sdk.push_scope() as scope: # Ігноруємо помилки, якщо юзер заблокував бота
-                        try:
-                            await bot.send_message(b['passenger_id'], text)
-                            await asyncio.to_thread(mark_booking_reminded, b['id'])
-                        except Exception: pass
+                    try: # Ігноруємо помилки, якщо юзер заблокував бота
+                        await bot.send_message(b['passenger_id'], text)
+                        await asyncio.to_thread(mark_booking_reminded, b['id'])
+                    except Exception: pass
                     
             except Exception as e:
                 logger.error(f"Reminder Error for {b['id']}: {e}")
@@ -168,24 +183,51 @@ async def check_reminders_job(bot: Bot):
     except Exception as e:
         logger.error(f"Scheduler Error: {e}")
 
+async def backup_job(full: bool):
+    try:
+        job = run_full_backup if full else run_incremental_backup
+        info = await asyncio.to_thread(job)
+        logger.info(f"🗄 Backup ({'full' if full else 'incremental'}): {info}")
+    except Exception as e:
+        logger.error(f"❌ Backup Error: {e}")
+
+async def warm_up(delay: float = 1.0):
+    """
+    Прогрів після старту: модулі пошуку міст, список міст і лічильники статистики.
+    Запускається вже після start_polling, тож перші апдейти не чекають на нього.
+    """
+    await asyncio.sleep(delay)
+    started = asyncio.get_running_loop().time()
+    try:
+        cities = await asyncio.to_thread(warm_up_search)
+        await asyncio.to_thread(get_counters, "users_total", "trips_active", "bookings_total")
+        logger.info(f"🔥 Warm-up: {cities} міст, {asyncio.get_running_loop().time() - started:.2f} с")
+    except Exception as e:
+        logger.warning(f"⚠️ Warm-up Error: {e}")
+
 # ==========================================
-# 🚀 MAIN FUNCTION
+# 🧩 ЗБІРКА ДИСПЕТЧЕРА
 # ==========================================
-async def main():
-    setup_logging()
-    
-    logger.info("🚀 Ініціалізація бази даних...")
-    init_db()
-    
-    logger.info("💻 Запуск бота...")
-    bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+def build_dispatcher(antiflood: bool = True, tracing: bool = bool(SENTRY_DSN)) -> Dispatcher:
+    """
+    Створює Dispatcher з усіма middleware та роутерами.
+    Використовується і ботом, і навантажувальними тестами (benchmarks/loadtest.py).
+    """
     dp = Dispatcher(storage=MemoryStorage())
 
     # Middleware
+    # Забанені відсіюються ще до роутингу (event_from_user вже є від UserContextMiddleware)
+    dp.update.outer_middleware(BanMiddleware())
+    if tracing:
+        # Першим, щоб у тривалість транзакції потрапили й очікування антифлуду
+        dp.message.middleware(TracingMiddleware())
+        dp.callback_query.middleware(TracingMiddleware())
     dp.message.middleware(ActivityMiddleware())
     dp.callback_query.middleware(ActivityMiddleware())
-    dp.message.middleware(AntiFloodMiddleware(limit=0.7))
-    dp.callback_query.middleware(AntiFloodMiddleware(limit=0.5))
+    if antiflood:
+        # Постійна швидкість як у старого ліміту (1 подія за 0.7 / 0.5 с), але з запасом на серію
+        dp.message.middleware(AntiFloodMiddleware(rate=1 / 0.7, burst=5, name="message"))
+        dp.callback_query.middleware(AntiFloodMiddleware(rate=1 / 0.5, burst=6, name="callback"))
 
     # Handlers
     dp.my_chat_member.register(on_user_block, ChatMemberUpdatedFilter(member_status_changed=KICKED | MEMBER))
@@ -199,15 +241,48 @@ async def main():
     dp.include_router(chat.router)
     dp.include_router(rating.router)
 
+    return dp
+
+# ==========================================
+# 🚀 MAIN FUNCTION
+# ==========================================
+async def main():
+    setup_logging()
+    
+    logger.info("🚀 Перевірка схеми бази даних...")
+    try:
+        version = ensure_schema_current()
+    except SchemaOutdatedError as e:
+        logger.critical(f"💀 {e}")
+        return
+    logger.info(f"✅ Схема v{version}")
+    banned, blocked = load_user_flags()
+    logger.info(f"⛔ У бані: {banned}, заблокували бота: {blocked}")
+    
+    logger.info("💻 Запуск бота...")
+    bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # 📤 Усі відправки — через чергу з лімітами Telegram і пріоритетами (sender.py)
+    bot.session.middleware(outbound)
+    dp = build_dispatcher()
+
     # Scheduler
     scheduler = AsyncIOScheduler()
     scheduler.add_job(check_reminders_job, 'interval', minutes=2, kwargs={'bot': bot})
+    # 🗄 Бекапи: повний щоночі + інкременти кожні 15 хв (у потоці, бот не чекає)
+    scheduler.add_job(backup_job, 'cron', hour=4, minute=0, kwargs={'full': True})
+    scheduler.add_job(backup_job, 'interval', minutes=15, kwargs={'full': False})
     scheduler.start()
     
     await bot.delete_webhook()
     
     # 🔥 Запускаємо фонові задачі (в т.ч. очистку старих поїздок)
     asyncio.create_task(background_tasks(bot))
+    # 🕓 Пакетний запис last_active
+    activity_task = asyncio.create_task(activity_tracker.run())
+    # 📊 Пакетний запис журналу подій
+    events_task = asyncio.create_task(event_log.run())
+    # 🔥 Прогрів кешів — фоном, коли polling уже працює
+    asyncio.create_task(warm_up())
 
     logger.info("🤖 Bot started!")
     try:
@@ -215,6 +290,10 @@ async def main():
     except Exception as e:
         logger.critical(f"💀 Polling Error: {e}")
     finally:
+        activity_task.cancel()
+        events_task.cancel()
+        await activity_tracker.flush()
+        await event_log.flush()
         await bot.session.close()
         logger.info("🛑 Bot stopped.")
 
@@ -1,20 +1,30 @@
 ﻿import time
 import asyncio
+from collections import Counter
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import Message, CallbackQuery
 
-# 👇 Імпорт функції з бази
-from database import update_user_activity
+from caches import ExpiringMap
+from activity import activity_tracker
+from config import ADMIN_IDS
+from database import banned_users, user_cache, ensure_user
+
+ACTIVITY_WRITE_INTERVAL = 300  # сек
+MAX_TRACKED_USERS = 200_000
 
 # ⚡ Кеш для збереження активності (User ID -> Timestamp)
-# Щоб не дьоргати базу кожну секунду
-last_activity_cache = {}
+# Щоб не дьоргати базу кожну секунду. Записи старші за інтервал
+# все одно нічого не дають, тому кеш їх сам викидає.
+last_activity_cache = ExpiringMap(ttl=ACTIVITY_WRITE_INTERVAL, max_size=MAX_TRACKED_USERS)
 
 class ActivityMiddleware(BaseMiddleware):
     """
     Оновлює час останньої активності користувача.
-    Пише в базу не частіше, ніж раз на 5 хвилин для кожного юзера.
+    Не частіше, ніж раз на 5 хвилин для кожного юзера кладе запис у activity_tracker,
+    який скидає все в базу пачкою у фоні. Новому юзеру рядок у users створюється
+    одразу, ще до хендлера (профіль у кеші = рядок вже є, база не потрібна).
     """
     async def __call__(
         self,
@@ -26,16 +36,18 @@ class ActivityMiddleware(BaseMiddleware):
         user = data.get("event_from_user")
         
         if user:
+            activity_tracker.mark_active(user.id)
             current_time = time.time()
             last_update = last_activity_cache.get(user.id, 0)
             
             # 🔥 Оптимізація: Оновлюємо базу тільки якщо пройшло > 5 хв (300 сек)
-            if current_time - last_update > 300:
-                username = f"@{user.username}" if user.username else None
-                full_name = user.full_name
+            if current_time - last_update > ACTIVITY_WRITE_INTERVAL:
+                if user.id not in user_cache:
+                    username = f"@{user.username}" if user.username else None
+                    await asyncio.to_thread(ensure_user, user.id, username, user.full_name)
                 
-                # Запускаємо в окремому потоці, щоб не блокувати Event Loop
-                await asyncio.to_thread(update_user_activity, user.id, username, full_name)
+                # В базу піде разом з іншими при наступному flush
+                activity_tracker.touch(user.id)
                 
                 # Оновлюємо кеш
                 last_activity_cache[user.id] = current_time
@@ -43,10 +55,43 @@ class ActivityMiddleware(BaseMiddleware):
         return await handler(event, data)
 
 
+# ==========================================
+# 🛡 АНТИФЛУД (TOKEN BUCKET)
+# ==========================================
+# Кожен юзер має "відро" на burst токенів, яке наповнюється зі швидкістю rate/сек.
+# Подія коштує стільки токенів, скільки вказано у прапорці хендлера "rate_cost"
+# (за замовчуванням 1), тож пошук чи геокодинг списують більше, ніж клік по меню:
+#
+#     @router.message(SearchStates.origin, flags={"rate_cost": 2, "heavy": "geocode"})
+#
+# Прапорець "heavy" додатково ставить хендлер у глобальну чергу з обмеженою
+# кількістю одночасних виконань (HEAVY_LIMITS).
+
+HEAVY_LIMITS = {"geocode": 2, "search": 8}
+_heavy_semaphores = {name: asyncio.Semaphore(n) for name, n in HEAVY_LIMITS.items()}
+
+# Лічильники для адмінки: passed / dropped / heavy_waits + дропи по хендлерах
+flood_stats = Counter()
+
+
 class AntiFloodMiddleware(BaseMiddleware):
-    def __init__(self, limit: float = 0.5):
-        self.rate_limit = limit
-        self.last_time = {}
+    def __init__(self, rate: float = 1.5, burst: float = 5, name: str = "event"):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        # user_id -> (tokens, timestamp). Через burst/rate секунд відро знову повне,
+        # тож старіші записи нічого не значать і викидаються кешем.
+        self.buckets = ExpiringMap(ttl=burst / rate, max_size=MAX_TRACKED_USERS)
+
+    def _consume(self, user_id: int, cost: float) -> bool:
+        now = time.monotonic()
+        tokens, last = self.buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < cost:
+            self.buckets[user_id] = (tokens, now)
+            return False
+        self.buckets[user_id] = (tokens - cost, now)
+        return True
 
     async def __call__(
         self,
@@ -54,8 +99,8 @@ class AntiFloodMiddleware(BaseMiddleware):
         event: Any,
         data: Dict[str, Any]
     ) -> Any:
-        
- 
+
+        # Альбоми приходять пачкою апдейтів — не ріжемо їх
         if hasattr(event, "media_group_id") and event.media_group_id:
             return await handler(event, data)
 
@@ -63,14 +108,45 @@ class AntiFloodMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        current_time = time.time()
-        
-        if user.id in self.last_time:
-            if current_time - self.last_time[user.id] < self.rate_limit:
-              
-                if isinstance(event, CallbackQuery):
-                    await event.answer("⏳ Не тисніть так швидко!", show_alert=True)
-                return 
-        
-        self.last_time[user.id] = current_time
-        return await handler(event, data)
\ No newline at end of file
+        cost = get_flag(data, "rate_cost", default=1)
+        if not self._consume(user.id, cost):
+            flood_stats["dropped"] += 1
+            callback = getattr(data.get("handler"), "callback", None)
+            flood_stats[f"dropped:{self.name}:{getattr(callback, '__name__', '?')}"] += 1
+            if isinstance(event, CallbackQuery):
+                await event.answer("⏳ Не тисніть так швидко!", show_alert=True)
+            return
+
+        flood_stats["passed"] += 1
+        heavy = get_flag(data, "heavy")
+        if heavy not in _heavy_semaphores:
+            return await handler(event, data)
+
+        semaphore = _heavy_semaphores[heavy]
+        if semaphore.locked():
+            flood_stats["heavy_waits"] += 1
+        async with semaphore:
+            return await handler(event, data)
+
+
+# ==========================================
+# ⛔ БАН (ДО РОУТИНГУ)
+# ==========================================
+
+class BanMiddleware(BaseMiddleware):
+    """
+    Outer middleware на update: апдейти забанених юзерів відкидаються ще до
+    фільтрів, FSM і хендлерів — лише перевірка в множині database.banned_users,
+    без жодного звернення до бази. Адміни не відсіюються ніколи.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user and user.id in banned_users and user.id not in ADMIN_IDS:
+            flood_stats["banned"] += 1
+            return
+        return await handler(event, data)
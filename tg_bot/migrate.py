@@ -1,23 +1,159 @@
-﻿import sqlite3
+﻿import argparse
+import importlib
+import os
+import sqlite3
+import sys
+import time
+
 from config import DB_FILE
 
-def migrate_db():
-    print(f"🔧 Підключаюсь до {DB_FILE}...")
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+# ==========================================
+# 🔧 МІГРАЦІЇ СХЕМИ
+# ==========================================
+# Файли migrations/NNNN_назва.py з функцією upgrade(conn) виконуються по черзі,
+# номер останньої застосованої міграції зберігається в PRAGMA user_version.
+#
+# За замовчуванням міграція йде однією транзакцією. Довгі (backfill великих таблиць)
+# ставлять TRANSACTIONAL = False і самі комітять пачками через backfill(),
+# тому мають бути ідемпотентними: після падіння їх можна просто запустити ще раз.
+#
+#     python migrate.py            # застосувати все
+#     python migrate.py --status   # показати версію бази
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+class SchemaOutdatedError(RuntimeError):
+    pass
+
+
+def list_migrations():
+    """[(версія, ім'я модуля)] у порядку застосування."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        prefix = filename.split("_", 1)[0]
+        if filename.endswith(".py") and prefix.isdigit():
+            found.append((int(prefix), filename[:-3]))
+    found.sort()
+    versions = [v for v, _ in found]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Номери міграцій мають йти підряд з 1: {versions}")
+    return found
+
+
+def latest_version() -> int:
+    migrations = list_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def get_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+# ---------- хелпери для файлів міграцій ----------
+
+def add_column_if_missing(conn, table, column, decl) -> bool:
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
 
+def backfill(conn, table, set_sql, where_sql, batch_size=5000, pause=0.01) -> int:
+    """
+    UPDATE великої таблиці пачками по batch_size рядків, кожна пачка — окрема
+    коротка транзакція. Між ними бот встигає писати, тож блокування тримається
+    мілісекунди, а не хвилини.
+    """
+    total = 0
+    while True:
+        cur = conn.execute(
+            f"UPDATE {table} SET {set_sql} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where_sql} LIMIT ?)",
+            (batch_size,)
+        )
+        conn.commit()
+        total += cur.rowcount
+        if cur.rowcount < batch_size:
+            return total
+        time.sleep(pause)
+
+# ---------- запуск ----------
+
+def migrate(db_path: str = DB_FILE, verbose: bool = True) -> int:
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        current = get_version(conn)
+        # Схема актуальна — жодного DDL і жодних блокувань, лише одне читання заголовка
+        if current and current >= latest_version():
+            return current
+    finally:
+        conn.close()
+
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn.execute("PRAGMA page_size = 4096;")   # діє лише на новій базі
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")   # теж; старі бази переводить міграція 0008
+    conn.execute("PRAGMA journal_mode = WAL;")
+    try:
+        current = get_version(conn)
+        for version, name in list_migrations():
+            if version <= current:
+                continue
+            module = importlib.import_module(f"migrations.{name}")
+            started = time.perf_counter()
+            if getattr(module, "TRANSACTIONAL", True):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    module.upgrade(conn)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            else:
+                module.upgrade(conn)
+                conn.commit()
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            current = version
+            if verbose:
+                print(f"✅ {name} ({time.perf_counter() - started:.2f} с)")
+        return current
+    finally:
+        conn.close()
+
+
+def ensure_schema_current(db_path: str = DB_FILE):
+    """Перевірка на старті бота: на неактуальній схемі не запускаємось."""
+    conn = sqlite3.connect(db_path)
     try:
-        # Додаємо колонку reminded в таблицю bookings
-        cursor.execute("ALTER TABLE bookings ADD COLUMN reminded INTEGER DEFAULT 0")
-        print("✅ Успіх! Колонка 'reminded' додана в таблицю 'bookings'.")
-    except sqlite3.OperationalError as e:
-        if "duplicate column name" in str(e):
-            print("ℹ️ Колонка 'reminded' вже існує. Нічого робити не треба.")
-        else:
-            print(f"❌ Помилка: {e}")
-
-    conn.commit()
-    conn.close()
+        version = get_version(conn)
+    finally:
+        conn.close()
+    expected = latest_version()
+    if version < expected:
+        raise SchemaOutdatedError(f"Схема бази v{version}, потрібна v{expected}. Запустіть: python migrate.py")
+    if version > expected:
+        raise SchemaOutdatedError(f"База v{version} новіша за код (v{expected}). Оновіть бота.")
+    return version
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Міграції схеми бази")
+    p.add_argument("--status", action="store_true", help="лише показати версію")
+    p.add_argument("--db", default=DB_FILE)
+    args = p.parse_args(argv)
+
+    if args.status:
+        conn = sqlite3.connect(args.db)
+        print(f"🔧 {args.db}: v{get_version(conn)} (остання v{latest_version()})")
+        conn.close()
+        return 0
+
+    print(f"🔧 Підключаюсь до {args.db}...")
+    version = migrate(args.db)
+    print(f"🏁 Схема актуальна: v{version}")
+    return 0
+
 
 if __name__ == "__main__":
-    migrate_db()
\ No newline at end of file
+    sys.exit(main())
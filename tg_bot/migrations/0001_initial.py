@@ -0,0 +1,106 @@
+﻿"""Базова схема (як її створював init_db до появи міграцій)."""
+
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    # 1. Користувачі
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            name TEXT,
+            phone TEXT,
+            model TEXT DEFAULT '-',
+            number TEXT DEFAULT '-',
+            color TEXT DEFAULT '-',
+            rating_driver REAL DEFAULT 5.0,
+            rating_pass REAL DEFAULT 5.0,
+            trips_count INTEGER DEFAULT 0,
+            is_banned INTEGER DEFAULT 0,
+            terms_accepted INTEGER DEFAULT 0,
+            ref_source TEXT,
+            is_blocked_bot INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_active DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+
+    # 2. Поїздки
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trips (
+            id TEXT PRIMARY KEY, 
+            user_id INTEGER,
+            origin TEXT,
+            destination TEXT,
+            date TEXT,
+            time TEXT,
+            seats_total INTEGER,
+            seats_taken INTEGER DEFAULT 0,
+            price INTEGER,
+            status TEXT DEFAULT 'active',
+            description TEXT DEFAULT '' 
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_search ON trips(origin, destination, date, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trips_user ON trips(user_id)")
+
+    # 3. Бронювання
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trip_id TEXT,
+            passenger_id INTEGER,
+            status TEXT DEFAULT 'active',
+            reminded INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_pass ON bookings(passenger_id, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bookings_trip ON bookings(trip_id)")
+
+    # 4. Історія повідомлень
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER,
+            receiver_id INTEGER,
+            message TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_read INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_pair ON chat_history(sender_id, receiver_id)")
+
+    # 5. Активні сесії чатів
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS active_chats (
+            user_id INTEGER PRIMARY KEY,
+            partner_id INTEGER
+        )
+    ''')
+
+    # 6. Очистка інтерфейсу
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interface_cleanup (
+            user_id INTEGER,
+            message_id INTEGER
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cleanup_user ON interface_cleanup(user_id)")
+
+    # 7. Інші таблиці
+    cursor.execute('CREATE TABLE IF NOT EXISTS cities (name TEXT PRIMARY KEY, search_count INTEGER DEFAULT 1)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS search_history (user_id INTEGER, origin TEXT, destination TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS subscriptions (user_id INTEGER, origin TEXT, destination TEXT, date TEXT)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS ratings (id INTEGER PRIMARY KEY AUTOINCREMENT, from_user_id INTEGER, to_user_id INTEGER, trip_id TEXT, role TEXT, score INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
+
+    # 8. Лог скасувань (Анти-скрапінг)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cancellation_logs (
+            user_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
@@ -0,0 +1,50 @@
+﻿"""
+Колонки, яких немає в базах, створених старими версіями init_db
+("table users has no column named created_at").
+
+ALTER TABLE ADD COLUMN не дозволяє DEFAULT CURRENT_TIMESTAMP, тому колонка
+додається порожньою, старі рядки заповнюються пачками (бот тим часом працює),
+а для нових рядків значення ставить тригер.
+"""
+from migrate import add_column_if_missing, backfill
+
+TRANSACTIONAL = False
+
+# (таблиця, колонка, чим заповнити старі рядки — справжній час невідомий)
+TIMESTAMP_COLUMNS = [
+    ("users", "created_at", "COALESCE(last_active, CURRENT_TIMESTAMP)"),
+    ("users", "last_active", "COALESCE(created_at, CURRENT_TIMESTAMP)"),
+    ("bookings", "created_at", "CURRENT_TIMESTAMP"),
+]
+
+PLAIN_COLUMNS = [
+    ("users", "trips_count", "INTEGER DEFAULT 0"),
+    ("users", "is_banned", "INTEGER DEFAULT 0"),
+    ("users", "terms_accepted", "INTEGER DEFAULT 0"),
+    ("users", "ref_source", "TEXT"),
+    ("users", "is_blocked_bot", "INTEGER DEFAULT 0"),
+    ("users", "rating_driver", "REAL DEFAULT 5.0"),
+    ("users", "rating_pass", "REAL DEFAULT 5.0"),
+    ("trips", "description", "TEXT DEFAULT ''"),
+    ("bookings", "reminded", "INTEGER DEFAULT 0"),
+]
+
+
+def upgrade(conn):
+    for table, column, decl in PLAIN_COLUMNS:
+        add_column_if_missing(conn, table, column, decl)
+
+    # Спочатку всі колонки, бо вирази заповнення посилаються одна на одну
+    added = [(t, c, fill) for t, c, fill in TIMESTAMP_COLUMNS if add_column_if_missing(conn, t, c, "DATETIME")]
+    for table, column, _ in added:
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_default AFTER INSERT ON {table}
+            WHEN NEW.{column} IS NULL
+            BEGIN
+                UPDATE {table} SET {column} = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+            END
+        ''')
+    conn.commit()
+
+    for table, column, fill in added:
+        backfill(conn, table, f"{column} = {fill}", f"{column} IS NULL")
@@ -0,0 +1,104 @@
+﻿"""
+Агрегати для адмінки: stats_counters / stats_daily + тригери, що їх підтримують.
+
+Визначення заморожені тут як на момент цієї міграції. Їхня зміна — це нова
+міграція, яка перестворює потрібні тригери і перераховує свої лічильники.
+"""
+TRANSACTIONAL = False
+
+# Кожен лічильник = SUM(вираз) по всій таблиці; X — псевдонім рядка (NEW / OLD / таблиця)
+STATS_COUNTERS = {
+    "users": {
+        "users_total": "1",
+        "users_blocked": "X.is_blocked_bot = 1",
+        "users_drivers": "X.model != '-'",
+    },
+    "trips": {
+        "trips_active": "X.status = 'active'",
+        "trips_finished": "X.status = 'finished'",
+        "gmv_finished": "CASE WHEN X.status = 'finished' THEN X.price * X.seats_taken END",
+        "active_price_sum": "CASE WHEN X.status = 'active' THEN X.price END",
+        "active_priced": "X.status = 'active' AND X.price IS NOT NULL",
+        "seats_taken_used": "CASE WHEN X.status IN ('active', 'finished') THEN X.seats_taken END",
+        "seats_total_used": "CASE WHEN X.status IN ('active', 'finished') THEN X.seats_total END",
+    },
+    "bookings": {
+        "bookings_total": "1",
+    },
+    "search_history": {
+        "searches_total": "1",
+    },
+}
+
+# Колонки, зміна яких впливає на лічильники (щоб не запускати тригер на кожен last_active)
+STATS_UPDATE_COLUMNS = {
+    "users": ("is_blocked_bot", "model"),
+    "trips": ("status", "price", "seats_taken", "seats_total"),
+}
+
+# Денні зрізи: лише накопичуються при вставці (історія лишається після очистки сирих даних)
+STATS_DAILY = {
+    "users": {"users_new": "date(X.created_at)"},
+    "bookings": {"bookings_new": "date(X.created_at)"},
+    "search_history": {"searches": "date(X.timestamp)"},
+}
+
+
+def _counter_delta(counters, alias):
+    cases = " ".join(
+        f"WHEN '{name}' THEN COALESCE(({expr.replace('X.', alias + '.')}), 0)"
+        for name, expr in counters.items()
+    )
+    return f"CASE name {cases} END"
+
+
+def _trigger_sql():
+    sql = []
+    for table, counters in STATS_COUNTERS.items():
+        names = ", ".join(f"'{n}'" for n in counters)
+        where = f"WHERE name IN ({names})"
+        new_delta, old_delta = _counter_delta(counters, "NEW"), _counter_delta(counters, "OLD")
+        daily = "".join(
+            f"INSERT INTO stats_daily (day, name, value) VALUES (COALESCE({day_expr.replace('X.', 'NEW.')}, date('now')), '{name}', 1) "
+            f"ON CONFLICT(day, name) DO UPDATE SET value = value + 1; "
+            for name, day_expr in STATS_DAILY.get(table, {}).items()
+        )
+        sql.append(f"CREATE TRIGGER trg_stats_{table}_ins AFTER INSERT ON {table} BEGIN "
+                   f"UPDATE stats_counters SET value = value + {new_delta} {where}; {daily}END")
+        sql.append(f"CREATE TRIGGER trg_stats_{table}_del AFTER DELETE ON {table} BEGIN "
+                   f"UPDATE stats_counters SET value = value - {old_delta} {where}; END")
+        if table in STATS_UPDATE_COLUMNS:
+            cols = ", ".join(STATS_UPDATE_COLUMNS[table])
+            sql.append(f"CREATE TRIGGER trg_stats_{table}_upd AFTER UPDATE OF {cols} ON {table} BEGIN "
+                       f"UPDATE stats_counters SET value = value + {new_delta} - {old_delta} {where}; END")
+    return sql
+
+
+def upgrade(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS stats_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID')
+    conn.execute('CREATE TABLE IF NOT EXISTS stats_daily (day TEXT, name TEXT, value INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (day, name)) WITHOUT ROWID')
+    conn.commit()
+
+    # Тригери і перерахунок в одній транзакції, щоб між ними не загубилась жодна вставка.
+    # Бази, де тригери вже стояли до появи міграцій, просто перераховуються наново.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stats_%'").fetchall():
+            conn.execute(f"DROP TRIGGER {name}")
+        for stmt in _trigger_sql():
+            conn.execute(stmt)
+
+        conn.execute("DELETE FROM stats_counters")
+        conn.execute("DELETE FROM stats_daily")
+        for table, counters in STATS_COUNTERS.items():
+            sums = ", ".join(f"COALESCE(SUM(COALESCE(({expr}), 0)), 0)" for expr in counters.values())
+            values = conn.execute(f"SELECT {sums} FROM {table} AS X").fetchone()
+            conn.executemany("INSERT INTO stats_counters (name, value) VALUES (?, ?)", zip(counters, values))
+        for table, daily in STATS_DAILY.items():
+            for name, day_expr in daily.items():
+                conn.execute(f"INSERT INTO stats_daily (day, name, value) "
+                             f"SELECT COALESCE({day_expr}, date('now')), '{name}', COUNT(*) FROM {table} AS X GROUP BY 1")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,47 @@
+﻿"""Журнал подій (events.py) і теплова карта попиту search_demand."""
+from migrate import add_column_if_missing
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            ts DATETIME NOT NULL,
+            user_id INTEGER,
+            event TEXT NOT NULL,
+            origin TEXT,
+            destination TEXT,
+            trip_id TEXT,
+            value INTEGER,
+            trip_date TEXT
+        )
+    ''')
+    # Бази, де events створено до появи trip_date
+    add_column_if_missing(conn, "events", "trip_date", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_event_ts ON events(event, ts)")
+
+    # Теплова карта попиту: маршрут x дата поїздки x година пошуку (UTC).
+    # Наповнюється тригером з events, тому рахується інкрементально разом із записом подій.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_demand (
+            origin TEXT,
+            destination TEXT,
+            date TEXT,
+            hour INTEGER,
+            searches INTEGER NOT NULL DEFAULT 0,
+            empty INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (origin, destination, date, hour)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_search_demand_date ON search_demand(date)")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_events_search_demand AFTER INSERT ON events
+        WHEN NEW.event IN ('search_success', 'search_empty') AND NEW.trip_date IS NOT NULL
+        BEGIN
+            INSERT INTO search_demand (origin, destination, date, hour, searches, empty)
+            VALUES (NEW.origin, NEW.destination, NEW.trip_date, CAST(strftime('%H', NEW.ts) AS INTEGER),
+                    1, NEW.event = 'search_empty')
+            ON CONFLICT(origin, destination, date, hour) DO UPDATE SET
+                searches = searches + 1, empty = empty + excluded.empty;
+        END
+    ''')
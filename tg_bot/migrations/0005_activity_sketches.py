@@ -0,0 +1,31 @@
+﻿"""Скетчі унікальних активних юзерів по днях (HyperLogLog, 2 KB/день) + заповнення з історії."""
+from sketch import HyperLogLog
+
+TRANSACTIONAL = False
+
+RETENTION_DAYS = 365
+
+SOURCES = (
+    "SELECT user_id, date(timestamp) FROM search_history",
+    "SELECT passenger_id, date(created_at) FROM bookings",
+    "SELECT user_id, date(last_active) FROM users",
+)
+
+
+def upgrade(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS activity_sketches (day TEXT PRIMARY KEY, registers BLOB NOT NULL) WITHOUT ROWID')
+    conn.commit()
+    if conn.execute("SELECT 1 FROM activity_sketches LIMIT 1").fetchone():
+        return
+
+    sketches = {}
+    for query in SOURCES:
+        for user_id, day in conn.execute(query):
+            if user_id is None or day is None: continue
+            sketch = sketches.get(day)
+            if sketch is None: sketch = sketches[day] = HyperLogLog()
+            sketch.add(user_id)
+    conn.executemany("INSERT OR IGNORE INTO activity_sketches (day, registers) VALUES (?, ?)",
+                     ((day, bytes(sk)) for day, sk in sketches.items()))
+    conn.execute("DELETE FROM activity_sketches WHERE day < date('now', ?)", (f"-{RETENTION_DAYS} days",))
+    conn.commit()
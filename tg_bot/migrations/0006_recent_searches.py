@@ -0,0 +1,29 @@
+﻿"""
+Останні пошуки — кільце з SLOTS слотів на юзера (ключ (user_id, slot)),
+заповнюється з search_history: останні різні маршрути кожного юзера.
+"""
+SLOTS = 5  # database.RECENT_SEARCHES_SLOTS на момент міграції
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recent_searches (
+            user_id INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            PRIMARY KEY (user_id, slot)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO recent_searches (user_id, slot, origin, destination, ts)
+        SELECT user_id, rn - 1, origin, destination, last_ts FROM (
+            SELECT user_id, origin, destination, MAX(timestamp) AS last_ts,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY MAX(timestamp) DESC) AS rn
+            FROM search_history
+            WHERE user_id IS NOT NULL AND origin IS NOT NULL AND destination IS NOT NULL
+            GROUP BY user_id, origin, destination
+        )
+        WHERE rn <= ?
+    ''', (SLOTS,))
@@ -0,0 +1,22 @@
+﻿"""
+Журнал дій для лімітів (limits.py) замість cancellation_logs: індекс (user_id, action, ts)
+замість повного скану таблиці. Скасування за останню добу переносяться як booking_cancel.
+"""
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS action_log (
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            ts REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_action_log_user ON action_log(user_id, action, ts)")
+    conn.execute('''
+        INSERT INTO action_log (user_id, action, ts)
+        SELECT user_id, 'booking_cancel', CAST(strftime('%s', timestamp) AS REAL)
+        FROM cancellation_logs
+        WHERE user_id IS NOT NULL AND timestamp > datetime('now', '-1 day')
+    ''')
+    conn.execute("DROP TABLE IF EXISTS cancellation_logs")
@@ -0,0 +1,26 @@
+﻿"""
+Очистка пачками (perform_db_cleanup): індекси під її фільтри за часом
+і auto_vacuum = INCREMENTAL, щоб звільнене місце віддавалось файлу потроху
+(PRAGMA incremental_vacuum) без повного VACUUM.
+
+Стара база переводиться в INCREMENTAL одним VACUUM — це перезапис усього
+файлу, тому міграцію варто запускати разом з оновленням, поки бот зупинено.
+"""
+TRANSACTIONAL = False
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_chat_history_ts ON chat_history(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_search_history_ts ON search_history(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts)",
+    "CREATE INDEX IF NOT EXISTS idx_trips_status_date ON trips(status, date)",
+    "CREATE INDEX IF NOT EXISTS idx_action_log_ts ON action_log(ts)",
+)
+
+
+def upgrade(conn):
+    for sql in INDEXES:
+        conn.execute(sql)
+        conn.commit()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
@@ -0,0 +1,14 @@
+﻿"""
+search_history більше ніхто не пише: останні пошуки живуть у recent_searches (0006),
+аналітика пошуків — у events (0004). Разом з таблицею йдуть її тригери лічильників
+з 0003, лічильник searches_total, денний зріз searches та індекс з 0008.
+"""
+
+
+def upgrade(conn):
+    conn.execute("DROP TRIGGER IF EXISTS trg_stats_search_history_ins")
+    conn.execute("DROP TRIGGER IF EXISTS trg_stats_search_history_del")
+    conn.execute("DROP INDEX IF EXISTS idx_search_history_ts")
+    conn.execute("DROP TABLE IF EXISTS search_history")
+    conn.execute("DELETE FROM stats_counters WHERE name = 'searches_total'")
+    conn.execute("DELETE FROM stats_daily WHERE name = 'searches'")
@@ -0,0 +1,255 @@
+﻿import asyncio
+import logging
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from caches import ExpiringMap
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 📤 ВИХІДНА ЧЕРГА TELEGRAM
+# ==========================================
+# Усі запити бота проходять через OutboundScheduler (middleware сесії),
+# тож хендлерам нічого міняти не треба. Для методів з LIMITED_METHODS:
+#   • FIFO на чат і пріоритет — повідомлення одного пріоритету в один чат ідуть
+#     строго по черзі, а відповідь юзеру не стоїть за сповіщеннями в той самий чат;
+#   • глобальне відро (GLOBAL_RATE/с) — для всіх;
+#   • відро на чат (CHAT_RATE/с із запасом CHAT_BURST) чекають лише bulk-відправки
+#     (розсилки, нагадування, сповіщення). Відповідь юзеру (interactive) на нього
+#     не чекає — екран з 4+ повідомлень іде одразу, — але токени витрачає,
+#     тож розсилка в той самий чат після неї теж іде 1/с;
+#   • пріоритети: interactive обслуговуються раніше за bulk — їх позначає
+#     блок `with bulk():`;
+#   • сповіщення іншому юзеру (водію про бронювання) — через send_later():
+#     bulk, і хендлер того, хто натиснув кнопку, на нього не чекає;
+#   • 429 Too Many Requests: чат ставиться на паузу retry_after секунд і запит
+#     повторюється (до MAX_RETRIES разів), замість тихого suppress(Exception).
+#     Якщо ліміт схожий на загальний для бота (глобальне відро вичерпане або
+#     інший чат уже на паузі через 429) — пауза і для глобального відра.
+# Редагування, видалення, answerCallbackQuery проходять без черги.
+
+INTERACTIVE, BULK = 0, 1
+PRIORITY_NAMES = ("interactive", "bulk")
+
+GLOBAL_RATE = 30      # повідомлень/с на бота (ліміт Telegram)
+GLOBAL_BURST = 30
+CHAT_RATE = 1         # повідомлень/с в один чат
+CHAT_BURST = 3        # серія bulk-повідомлень в один чат; далі 1/с
+MAX_RETRIES = 3
+# Методи, що створюють повідомлення в чаті (sendChatAction та інші не рахуються)
+LIMITED_METHODS = frozenset({
+    "sendMessage", "sendPhoto", "sendVideo", "sendAnimation", "sendAudio", "sendDocument",
+    "sendVoice", "sendVideoNote", "sendSticker", "sendMediaGroup", "sendLocation", "sendVenue",
+    "sendContact", "sendPoll", "sendDice", "sendInvoice",
+    "copyMessage", "copyMessages", "forwardMessage", "forwardMessages",
+})
+
+send_priority: ContextVar[int] = ContextVar("send_priority", default=INTERACTIVE)
+
+# sent:<priority> / retry_after / retry_after_global / failed_429 / wait_ms:<priority> / wait_max_ms
+sender_stats = Counter()
+
+
+@contextmanager
+def bulk():
+    """
+    Все, що відправляється всередині блоку (і в задачах, створених у ньому),
+    йде з низьким пріоритетом:
+
+        with bulk():
+            await bot.send_message(...)
+    """
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+_background = set()
+
+
+def send_later(coro):
+    """
+    Запускає відправку окремою bulk-задачею і не чекає на неї. Помилки лише
+    логуються — як раніше з suppress(Exception) навколо таких сповіщень.
+    """
+    async def run():
+        send_priority.set(BULK)   # задача має власну копію контексту
+        try:
+            await coro
+        except Exception as e:
+            logger.debug(f"send_later: {e}")
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+class PriorityBucket:
+    """
+    Token bucket з чергою очікування по пріоритетах: поки є interactive-очікувачі,
+    bulk токенів не отримує. pause() блокує видачу (відповідь 429).
+    """
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._waiters = tuple(deque() for _ in PRIORITY_NAMES)
+        self._timer = None
+
+    def __len__(self):
+        return sum(len(w) for w in self._waiters)
+
+    @property
+    def available(self) -> float:
+        return min(self.burst, self.tokens + (self.clock() - self.updated) * self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    async def wait_unpaused(self):
+        while (delay := self.paused_until - self.clock()) > 0:
+            await asyncio.sleep(delay)
+
+    def spend(self):
+        """Забирає токен, якщо він є, без очікування (interactive поза чергою)."""
+        self._try_take()
+
+    def _try_take(self) -> bool:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        if not any(self._waiters[:priority + 1]) and self._try_take():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        self._schedule()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.tokens += 1   # токен видали, але він уже не потрібен
+            else:
+                self._waiters[priority].remove(waiter)
+            raise
+
+    def _schedule(self):
+        if self._timer is not None or not len(self):
+            return
+        now = self.clock()
+        delay = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        for queue in self._waiters:
+            while queue:
+                if queue[0].done():   # скасований очікувач
+                    queue.popleft()
+                    continue
+                if not self._try_take():
+                    self._schedule()
+                    return
+                queue.popleft().set_result(None)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    def __init__(self, global_rate: float = GLOBAL_RATE, global_burst: float = GLOBAL_BURST,
+                 chat_rate: float = CHAT_RATE, chat_burst: float = CHAT_BURST, max_retries: int = MAX_RETRIES):
+        self.global_bucket = PriorityBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        # Через burst/rate с простою відро чату знову повне — такий запис можна забути
+        self._chat_buckets = ExpiringMap(ttl=max(chat_burst / chat_rate, 60))
+        self._chat_locks = {}   # (chat_id, пріоритет) -> [Lock, скільки запитів тримає/чекає]
+        self._last_429 = (None, 0.0)   # (chat_id, до коли пауза) — останній 429
+
+    @property
+    def queued(self) -> int:
+        return sum(refs for _, refs in self._chat_locks.values())
+
+    def _chat_bucket(self, chat_id) -> PriorityBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = PriorityBucket(self.chat_rate, self.chat_burst)
+        self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _is_global_limit(self, chat_id, retry_after: float) -> bool:
+        """
+        Telegram не каже, який ліміт спрацював. Вважаємо його загальним, якщо ми
+        й так відправляли на межі GLOBAL_RATE (глобальне відро порожнє) або 429
+        за короткий час прийшов уже в інший чат.
+        """
+        now = time.monotonic()
+        last_chat, last_until = self._last_429
+        self._last_429 = (chat_id, now + retry_after)
+        return self.global_bucket.available < 1 or (last_chat != chat_id and now < last_until)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or method.__api_method__ not in LIMITED_METHODS:
+            return await make_request(bot, method)
+
+        priority = send_priority.get()
+        key = (chat_id, priority)
+        entry = self._chat_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        started = time.monotonic()
+        try:
+            async with entry[0]:
+                bucket = self._chat_bucket(chat_id)
+                for attempt in range(self.max_retries + 1):
+                    if priority == BULK:
+                        await bucket.acquire(priority)
+                    else:
+                        await bucket.wait_unpaused()   # 429 у цьому чаті чекають усі
+                        bucket.spend()
+                    await self.global_bucket.acquire(priority)
+                    if attempt == 0:
+                        waited_ms = (time.monotonic() - started) * 1000
+                        sender_stats[f"wait_ms:{PRIORITY_NAMES[priority]}"] += round(waited_ms)
+                        sender_stats["wait_max_ms"] = max(sender_stats["wait_max_ms"], round(waited_ms))
+                    try:
+                        response = await make_request(bot, method)
+                    except TelegramRetryAfter as e:
+                        sender_stats["retry_after"] += 1
+                        if attempt == self.max_retries:
+                            sender_stats["failed_429"] += 1
+                            raise
+                        bucket.pause(e.retry_after)
+                        if self._is_global_limit(chat_id, e.retry_after):
+                            sender_stats["retry_after_global"] += 1
+                            self.global_bucket.pause(e.retry_after)
+                            logger.warning(f"⏳ 429 (загальний ліміт) для чату {chat_id}: пауза всіх відправок {e.retry_after} с")
+                        else:
+                            logger.warning(f"⏳ 429 для чату {chat_id}: пауза {e.retry_after} с ({method.__api_method__})")
+                        continue
+                    sender_stats[f"sent:{PRIORITY_NAMES[priority]}"] += 1
+                    return response
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._chat_locks.pop(key, None)
+
+
+outbound = OutboundScheduler()
@@ -0,0 +1,53 @@
+﻿import math
+from hashlib import blake2b
+
+# ==========================================
+# 📐 HYPERLOGLOG (УНІКАЛЬНІ КОРИСТУВАЧІ)
+# ==========================================
+
+class HyperLogLog:
+    """
+    Оцінка кількості унікальних user_id у фіксованих 2^p байтах.
+    При p=11 це 2 KB на день і похибка ~2.3%; для малих чисел
+    (до кількох тисяч) працює лінійний підрахунок, який майже точний.
+    Скетчі об'єднуються (merge) без втрати точності — так рахуємо WAU/MAU.
+    """
+
+    def __init__(self, p: int = 11, registers: bytes = None):
+        self.p = p
+        self.m = 1 << p
+        if registers is not None and len(registers) != self.m:
+            raise ValueError(f"Очікується {self.m} регістрів, отримано {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, user_id: int):
+        h = int.from_bytes(blake2b(user_id.to_bytes(8, "little", signed=True), digest_size=8).digest(), "little")
+        idx = h & (self.m - 1)
+        rank = (64 - self.p) - (h >> self.p).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("Не можна об'єднати скетчі з різним p")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def __bytes__(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def merged(cls, blobs, p: int = 11) -> "HyperLogLog":
+        result = cls(p)
+        for blob in blobs:
+            result.merge(cls(p, blob))
+        return result
@@ -0,0 +1,171 @@
+﻿import fnmatch
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+
+from config import (
+    SENTRY_TRACES_RATE, SENTRY_PROFILES_RATE, SENTRY_TRACE_RULES,
+    SENTRY_SLOW_UPDATE_MS, SENTRY_TAIL_SAMPLING
+)
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# 🔭 SENTRY: ВІДБІР ТРАНЗАКЦІЙ
+# ==========================================
+# Кожен апдейт = транзакція з іменем хендлера ("passenger.process_search_date").
+# Частка для хендлера — перше правило з SENTRY_TRACE_RULES, що підходить (fnmatch),
+# інакше SENTRY_TRACES_RATE.
+#
+# head-режим (за замовчуванням): рішення на старті апдейту, невідібрані апдейти
+#             лише міряються perf_counter. Якщо такий апдейт упав або тривав
+#             >= SENTRY_SLOW_UPDATE_MS, транзакція створюється вже після нього
+#             (start_timestamp = початок апдейту), без дочірніх спанів.
+# tail-режим (SENTRY_TAIL_SAMPLING=1): пишемо спани всіх апдейтів, а після завершення лишаємо
+#             помилки, повільні (>= SENTRY_SLOW_UPDATE_MS) і rate-частку решти;
+#             непотрібне відкидає before_send_transaction ще до відправки.
+# Помилки (capture_exception) йдуть окремими подіями і від цього відбору не залежать.
+
+UPDATE_OP = "aiogram.update"
+tracing_stats = Counter()   # kept:error / kept:slow / kept:rate / dropped
+
+
+def parse_rules(spec: str) -> list:
+    """'admin.*=0.2, passenger.*=0.05' -> [('admin.*', 0.2), ('passenger.*', 0.05)]"""
+    rules = []
+    for chunk in spec.split(","):
+        if not chunk.strip(): continue
+        pattern, _, rate = chunk.partition("=")
+        try:
+            rules.append((pattern.strip(), min(max(float(rate), 0.0), 1.0)))
+        except ValueError:
+            logger.warning(f"⚠️ SENTRY_TRACE_RULES: пропускаю {chunk.strip()!r}")
+    return rules
+
+
+class TracingConfig:
+    def __init__(self, default_rate: float = SENTRY_TRACES_RATE, rules: list = None,
+                 slow_ms: float = SENTRY_SLOW_UPDATE_MS, tail: bool = SENTRY_TAIL_SAMPLING,
+                 profiles_rate: float = SENTRY_PROFILES_RATE):
+        self.default_rate = default_rate
+        self.rules = parse_rules(SENTRY_TRACE_RULES) if rules is None else rules
+        self.slow_ms = slow_ms
+        self.tail = tail
+        self.profiles_rate = profiles_rate
+        self._rates = {}   # кеш: ім'я хендлера -> частка
+
+    def rate_for(self, name: str) -> float:
+        rate = self._rates.get(name)
+        if rate is None:
+            rate = next((r for pattern, r in self.rules if fnmatch.fnmatchcase(name, pattern)), self.default_rate)
+            self._rates[name] = rate
+        return rate
+
+    def traces_sampler(self, sampling_context: dict) -> float:
+        if sampling_context.get("parent_sampled") is not None:
+            return float(sampling_context["parent_sampled"])
+        # Апдейти відбирає TracingMiddleware (sampled=True), сюди доходять інші транзакції
+        tx = sampling_context.get("transaction_context") or {}
+        return self.rate_for(tx.get("name") or "")
+
+    def before_send_transaction(self, event: dict, hint: dict):
+        if (event.get("tags") or {}).get("sampling") == "dropped":
+            return None
+        return event
+
+    def sentry_options(self) -> dict:
+        return {
+            "traces_sampler": self.traces_sampler,
+            "before_send_transaction": self.before_send_transaction,
+            "profiles_sample_rate": self.profiles_rate,
+        }
+
+
+tracing_config = TracingConfig()
+
+
+def init_sentry(dsn: str, config: TracingConfig = tracing_config, **options):
+    import sentry_sdk  # ліниво: без DSN модуль не потрібен
+    sentry_sdk.init(dsn=dsn, **config.sentry_options(), **options)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    handler = data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "unknown"
+    module = callback.__module__.removeprefix("handlers.")
+    return f"{module}.{getattr(callback, '__name__', type(callback).__name__)}"
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Обгортає хендлер у транзакцію Sentry (inner middleware, ім'я хендлера вже відоме).
+    Реєструється лише коли Sentry ініціалізовано (SENTRY_DSN).
+    """
+
+    def __init__(self, config: TracingConfig = tracing_config):
+        import sentry_sdk
+        self._sentry = sentry_sdk
+        self.config = config
+
+    async def _untraced(self, handler, event, data, name: str):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if failed or elapsed * 1000 >= self.config.slow_ms:
+                self._record_late(name, elapsed, "kept:error" if failed else "kept:slow")
+
+    def _record_late(self, name: str, elapsed: float, reason: str):
+        """Транзакція для невідібраного апдейту, заднім числом від його початку."""
+        start = datetime.now(timezone.utc) - timedelta(seconds=elapsed)
+        tx = self._sentry.start_transaction(op=UPDATE_OP, name=name, source="component",
+                                            sampled=True, start_timestamp=start)
+        if reason == "kept:error":
+            tx.set_status("internal_error")
+        tx.set_tag("sampling", reason)
+        tx.finish()
+        tracing_stats[reason] += 1
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        name = handler_name(data)
+        rate = self.config.rate_for(name)
+        # head-режим: кидаємо монетку самі — невідібраний апдейт не створює навіть
+        # порожньої транзакції (це ~100 мкс на апдейт, див. benchmarks/bench_tracing.py)
+        if not self.config.tail and not random.random() < rate:
+            return await self._untraced(handler, event, data, name)
+
+        started = time.perf_counter()
+        failed = False
+        with self._sentry.start_transaction(op=UPDATE_OP, name=name, source="component", sampled=True) as tx:
+            try:
+                return await handler(event, data)
+            except Exception:
+                failed = True
+                tx.set_status("internal_error")
+                raise
+            finally:
+                if self.config.tail:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    if failed: reason = "kept:error"
+                    elif elapsed_ms >= self.config.slow_ms: reason = "kept:slow"
+                    elif random.random() < rate: reason = "kept:rate"
+                    else: reason = "dropped"
+                    tx.set_tag("sampling", reason)
+                    tracing_stats[reason] += 1
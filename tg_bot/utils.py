@@ -1,4 +1,5 @@
 ﻿import asyncio
+import logging
 import re
 import html
 from contextlib import suppress
@@ -6,16 +7,42 @@ from aiogram import types, Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-# Бібліотеки для пошуку
-from thefuzz import process
-from geopy.geocoders import Nominatim
 from database import get_all_cities_names
 
-# Налаштування Nominatim (User-Agent обов'язковий!)
-geolocator = Nominatim(
-    user_agent="pidsadka_lviv_bot_v2_admin_contact", 
-    timeout=10
-)
+logger = logging.getLogger(__name__)
+
+# thefuzz і geopy вантажимо при першому пошуку міста (або у warm_up_search),
+# а не при імпорті — це помітна частина часу старту бота.
+# geolocator можна підмінити ззовні (benchmarks/loadtest.py ставить офлайн-геокодер).
+geolocator = None
+_fuzzy_process = None
+
+
+def get_geolocator():
+    global geolocator
+    if geolocator is None:
+        from geopy.geocoders import Nominatim
+        # Налаштування Nominatim (User-Agent обов'язковий!)
+        geolocator = Nominatim(
+            user_agent="pidsadka_lviv_bot_v2_admin_contact",
+            timeout=10
+        )
+    return geolocator
+
+
+def get_fuzzy_process():
+    global _fuzzy_process
+    if _fuzzy_process is None:
+        from thefuzz import process
+        _fuzzy_process = process
+    return _fuzzy_process
+
+
+def warm_up_search():
+    """Підвантажує модулі пошуку міст заздалегідь (фоном після старту, в потоці)."""
+    get_fuzzy_process()
+    get_geolocator()
+    return len(get_all_cities_names())
 
 # ==========================================
 # 🧹 МАГІЯ ОЧИЩЕННЯ (UI ENGINE)
@@ -93,16 +120,16 @@ def get_city_suggestion(raw_input: str) -> str | None:
     if not raw_input: return None
     known_cities = get_all_cities_names()
     if not known_cities: return None
-    best_match = process.extractOne(raw_input, known_cities)
+    best_match = get_fuzzy_process().extractOne(raw_input, known_cities)
     if best_match and best_match[1] >= 75:
         return best_match[0]
     return None
 
 def _geocode_sync(text: str):
     try:
-        return geolocator.geocode(text, language="uk")
+        return get_geolocator().geocode(text, language="uk")
     except Exception as e:
-        print(f"⚠️ Geopy Error: {e}")
+        logger.warning(f"⚠️ Geopy Error: {e}")
         return None
 
 async def validate_city_real(city_name: str) -> str | None: